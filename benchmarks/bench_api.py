@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+""" End to end benchmarks of the twitter library against mock_twitter.
+
+Measures request throughput, p50/p99 latency, memory per 1k tweets,
+signing cost and update_with_media upload throughput, and writes the
+results as JSON so runs can be compared.
+
+Usage: python benchmarks/bench_api.py [--output bench.json] [--latency 20]
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+
+import mock_twitter
+
+TWITTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                            'extensions', 'webservice', 'twitter', 'twitter')
+SECRETS = ('consumer-key', 'consumer-secret', 'access-key', 'access-secret')
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round(percent / 100.0 * (len(values) - 1)))]
+
+
+def deep_size(value, seen=None):
+    """ Bytes held by value and everything it references. """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum([deep_size(k, seen) + deep_size(v, seen)
+                     for k, v in value.items()])
+    elif isinstance(value, (list, tuple, set)):
+        size += sum([deep_size(item, seen) for item in value])
+    elif hasattr(value, '__slots__'):
+        size += sum([deep_size(getattr(value, slot), seen)
+                     for slot in value.__slots__
+                     if slot != '__weakref__' and hasattr(value, slot)])
+    return size
+
+
+def drive(jobs, concurrency):
+    """ Runs jobs, callables taking a done(ok) callback, on the main loop.
+
+    Returns the seconds each job took, how many failed and the wall time.
+    """
+    from gi.repository import GObject
+
+    loop = GObject.MainLoop()
+    latencies = []
+    state = {'next': 0, 'running': 0, 'failed': 0}
+
+    def launch():
+        while state['running'] < concurrency and state['next'] < len(jobs):
+            job = jobs[state['next']]
+            state['next'] += 1
+            state['running'] += 1
+            job(lambda ok, started=time.time(): done(ok, started))
+
+        if state['running'] == 0:
+            loop.quit()
+        return False
+
+    def done(ok, started):
+        latencies.append(time.time() - started)
+        state['running'] -= 1
+        if not ok:
+            state['failed'] += 1
+        GObject.idle_add(launch)
+
+    started = time.time()
+    GObject.idle_add(launch)
+    loop.run()
+
+    return latencies, state['failed'], time.time() - started
+
+
+def timeline_job(twitter, since_id, count):
+    def job(done):
+        timeline = twitter.TwrTimeline()
+        timeline.connect('mentions-downloaded',
+                         lambda timeline, info: done(True))
+        timeline.connect('mentions-downloaded-failed',
+                         lambda timeline, message: done(False))
+        # a distinct since_id keeps the cache and coalescing out of it
+        timeline.mentions_timeline(count, since_id)
+    return job
+
+
+def upload_job(twitter, filepath, chunked):
+    def job(done):
+        status = twitter.TwrStatus()
+        status.connect('status-updated', lambda status, info: done(True))
+        status.connect('status-updated-failed',
+                       lambda status, message: done(False))
+        status.update_with_media('benchmark', filepath, chunked=chunked)
+    return job
+
+
+def bench_requests(twitter, args, concurrency):
+    jobs = [timeline_job(twitter, mock_twitter.TOP_ID - 100000 - i,
+                         args.count)
+            for i in range(args.requests)]
+    latencies, failed, wall = drive(jobs, concurrency)
+
+    return {'requests': len(jobs),
+            'concurrency': concurrency,
+            'failed': failed,
+            'seconds': wall,
+            'requests_per_second': len(jobs) / wall,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000}
+
+
+def bench_memory(args):
+    from twr_models import TwrProjection
+
+    statuses = json.loads(json.dumps(
+        mock_twitter.make_page({'count': 200},
+                               args.text_size, args.users) * 5))
+    projection = TwrProjection(('id_str', 'in_reply_to_status_id_str',
+                                'text', 'created_at'), ('name',))
+
+    dicts = deep_size(statuses)
+    models = deep_size(projection.decode(statuses))
+
+    return {'tweets': len(statuses),
+            'dict_bytes_per_1k': dicts * 1000 / len(statuses),
+            'model_bytes_per_1k': models * 1000 / len(statuses)}
+
+
+def bench_signing(seconds):
+    from twr_signer import TwrSigner
+
+    signer = TwrSigner(*SECRETS)
+    url = 'https://api.twitter.com/1.1/statuses/mentions_timeline.json'
+    params = [('count', 200), ('since_id', str(mock_twitter.SHARED_ID))]
+
+    done = 0
+    started = time.time()
+    while time.time() - started < seconds:
+        signer.authorization_header('GET', url, params)
+        done += 1
+
+    return {'headers_per_second': done / (time.time() - started)}
+
+
+def bench_upload(twitter, args, chunked):
+    handle, filepath = tempfile.mkstemp(prefix='bench-upload-')
+    try:
+        os.write(handle, os.urandom(args.upload_size))
+        os.close(handle)
+
+        jobs = [upload_job(twitter, filepath, chunked)
+                for i in range(args.uploads)]
+        latencies, failed, wall = drive(jobs, 1)
+    finally:
+        os.unlink(filepath)
+        if os.path.exists('%s.upload' % filepath):
+            os.unlink('%s.upload' % filepath)
+
+    return {'uploads': len(jobs),
+            'bytes': args.upload_size,
+            'failed': failed,
+            'bytes_per_second': args.upload_size * len(jobs) / wall,
+            'p50_ms': percentile(latencies, 50) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='twitter benchmarks')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--count', type=int, default=20,
+                        help='statuses per timeline request')
+    parser.add_argument('--uploads', type=int, default=10)
+    parser.add_argument('--upload-size', type=int, default=1024 * 1024)
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='seconds spent on the signing scenario')
+    mock_twitter.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = mock_twitter.MockTwitter(mock_twitter.config_from(args))
+    server.start()
+
+    # the endpoint URLs are read when the module is imported
+    os.environ['TWR_API_BASE'] = server.url
+    sys.path.insert(0, TWITTER_PATH)
+    import twitter
+
+    twitter.TwrAccount.set_secrets(*SECRETS)
+
+    results = {'timestamp': time.time(),
+               'python': platform.python_version(),
+               'config': vars(args),
+               'scenarios': {}}
+    scenarios = results['scenarios']
+
+    scenarios['throughput'] = bench_requests(twitter, args, args.concurrency)
+    scenarios['latency'] = bench_requests(twitter, args, 1)
+    scenarios['memory'] = bench_memory(args)
+    scenarios['signing'] = bench_signing(args.seconds)
+    scenarios['upload'] = bench_upload(twitter, args, False)
+    scenarios['upload_chunked'] = bench_upload(twitter, args, True)
+    scenarios['server'] = {'requests': server.config.requests,
+                           'injected_errors': server.config.errors}
+    results['transfers'] = twitter.TwrStats.get_default().summary()
+
+    server.stop()
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=4, sort_keys=True)
+
+    for name, values in sorted(scenarios.items()):
+        print '%-16s %s' % (name, json.dumps(values, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
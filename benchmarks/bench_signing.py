@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+""" Authorization headers per second, before and after TwrSigner.
+
+Usage: python benchmarks/bench_signing.py [seconds]
+"""
+
+import os
+import sys
+import time
+import hmac
+import random
+import urllib
+import hashlib
+import binascii
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+from twr_signer import TwrSigner
+
+SECRETS = ('consumer-key', 'consumer-secret', 'access-key', 'access-secret')
+URL = 'https://api.twitter.com/1.1/statuses/mentions_timeline.json'
+PARAMS = [('count', 200), ('since_id', '367838226893516800')]
+BATCH = 100
+
+
+def _percent(string):
+    return urllib.quote(str(string), safe='~')
+
+
+def legacy_header(method, url, request_params, nonce=None, timestamp=None):
+    """ TwrAccount.authorization_header as it was before TwrSigner. """
+    c_key, c_secret, a_key, a_secret = SECRETS
+
+    if nonce is None:
+        nonce = ''.join([str(random.randint(0, 9)) for i in range(8)])
+    if timestamp is None:
+        timestamp = int(time.time())
+
+    params = dict([('oauth_nonce', nonce),
+                   ('oauth_timestamp', timestamp),
+                   ('oauth_consumer_key', c_key),
+                   ('oauth_version', '1.0'),
+                   ('oauth_token', a_key),
+                   ('oauth_signature_method', 'HMAC-SHA1')] + request_params)
+
+    key_values = [(_percent(str(k).encode('utf-8')),
+                   _percent(str(v).encode('utf-8')))
+                  for k, v in params.items()]
+    key_values.sort()
+    string_params = '&'.join(['%s=%s' % (k, v) for k, v in key_values])
+
+    raw = '&'.join((method, _percent(url), _percent(string_params)))
+    key = '%s&%s' % (_percent(c_secret), _percent(a_secret))
+    hashed = hmac.new(key, raw, hashlib.sha1)
+    params['oauth_signature'] = binascii.b2a_base64(hashed.digest())[:-1]
+
+    return 'OAuth %s' % ', '.join(['%s="%s"' % (k, _percent(v))
+                                   for k, v in sorted(params.iteritems())])
+
+
+def rate(function, seconds, per_call=1):
+    calls = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        function()
+        calls += 1
+    return calls * per_call / (time.time() - start)
+
+
+def main():
+    seconds = 2.0
+    if len(sys.argv) > 1:
+        seconds = float(sys.argv[1])
+
+    signer = TwrSigner(*SECRETS)
+
+    # same inputs must give the same header
+    assert legacy_header('GET', URL, PARAMS, '12345678', 1376000000) == \
+        signer.authorization_header('GET', URL, PARAMS, '12345678',
+                                    1376000000)
+
+    requests = [('GET', URL, PARAMS)] * BATCH
+    results = [
+        ('legacy', rate(lambda: legacy_header('GET', URL, PARAMS), seconds)),
+        ('signer', rate(lambda: signer.authorization_header('GET', URL,
+                                                            PARAMS),
+                        seconds)),
+        ('batch', rate(lambda: signer.authorization_headers(requests),
+                       seconds, BATCH))]
+
+    for name, headers in results:
+        print '%-8s %10.0f headers/sec' % (name, headers)
+    print 'speedup  %10.2fx' % (results[1][1] / results[0][1])
+
+
+if __name__ == '__main__':
+    main()
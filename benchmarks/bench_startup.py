@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+""" What loading the twitter extension adds to the Journal's startup.
+
+Each run is a fresh interpreter. It first imports what the Journal has
+loaded anyway before it looks at extensions, then either stops there
+(baseline) or imports the account module and calls get_account(), which
+is what jarabe does at boot. Also reports which heavy modules were
+loaded, none of them should be until the extension is used.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--output startup.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+EXTENSIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'extensions')
+
+HEAVY_MODULES = ('pycurl', 'gi.repository.WebKit', 'gi.repository.GdkPixbuf',
+                 'cProfile', 'pstats')
+
+CHILD = """
+import sys
+import time
+import json
+
+started = time.time()
+from gi.repository import Gtk
+from gi.repository import GConf
+from gi.repository import GObject
+from sugar3.datastore import datastore
+from sugar3.graphics.alert import NotifyAlert
+from jarabe.journal import journalwindow
+from jarabe.web import account
+journal = time.time()
+
+imported = loaded = journal
+if %(extension)r:
+    sys.path.insert(0, %(path)r)
+    module = __import__(%(module)r, fromlist=['get_account'])
+    imported = time.time()
+    module.get_account()
+    loaded = time.time()
+
+print json.dumps({'journal': journal - started,
+                  'import': imported - journal,
+                  'get_account': loaded - imported,
+                  'heavy': [name for name in %(heavy)r
+                            if name in sys.modules]})
+"""
+
+
+def run(module, extension):
+    code = CHILD % {'extension': extension,
+                    'path': EXTENSIONS_PATH,
+                    'module': module,
+                    'heavy': HEAVY_MODULES}
+
+    started = time.time()
+    output = subprocess.check_output([sys.executable, '-c', code])
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall'] = time.time() - started
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+
+def summarize(runs):
+    summary = {}
+    for key in ('wall', 'journal', 'import', 'get_account'):
+        values = [result[key] * 1000 for result in runs]
+        summary['%s_ms' % key] = {'median': median(values),
+                                  'min': min(values)}
+    summary['heavy_modules'] = sorted(set(sum([result['heavy']
+                                               for result in runs], [])))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='extension startup cost')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--module', default='webservice.twitter.account')
+    parser.add_argument('--output', default='startup.json')
+    args = parser.parse_args()
+
+    baseline = []
+    extension = []
+    # interleaved, so both see the same cache and load conditions
+    for i in range(args.runs):
+        baseline.append(run(args.module, False))
+        extension.append(run(args.module, True))
+
+    results = {'timestamp': time.time(),
+               'runs': args.runs,
+               'module': args.module,
+               'baseline': summarize(baseline),
+               'extension': summarize(extension)}
+    results['added_ms'] = results['extension']['wall_ms']['median'] - \
+        results['baseline']['wall_ms']['median']
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=4, sort_keys=True)
+
+    print 'baseline  %.1f ms' % results['baseline']['wall_ms']['median']
+    print 'extension %.1f ms' % results['extension']['wall_ms']['median']
+    print 'added     %.1f ms' % results['added_ms']
+    print 'heavy modules loaded: %s' % \
+        ', '.join(results['extension']['heavy_modules'] or ['none'])
+
+
+if __name__ == '__main__':
+    main()
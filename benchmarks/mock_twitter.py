@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+""" A local stand-in for api.twitter.com and upload.twitter.com.
+
+Answers the endpoints the extension uses with generated statuses, with
+configurable latency, payload size, rate limits and injected errors.
+Point the extension at it with TWR_API_BASE=http://127.0.0.1:<port>.
+
+Usage: python benchmarks/mock_twitter.py [--port 8080] [--latency 50] ...
+"""
+
+import cgi
+import json
+import time
+import random
+import urlparse
+import argparse
+import threading
+import BaseHTTPServer
+import SocketServer
+
+TOP_ID = 400000000000000000
+SHARED_ID = TOP_ID - 1000000
+CREATED_AT = 'Wed Aug 27 13:08:45 +0000 2008'
+
+
+def make_tweet(tweet_id, text_size=140, users=20, reply_to=None):
+    user_id = tweet_id % users
+    return {'id': tweet_id,
+            'id_str': str(tweet_id),
+            'text': ('#sugar tweet %d ' % tweet_id).ljust(text_size, 'x'),
+            'created_at': CREATED_AT,
+            'source': 'web',
+            'lang': 'en',
+            'retweet_count': 0,
+            'favorite_count': 0,
+            'in_reply_to_status_id': reply_to,
+            'in_reply_to_status_id_str': reply_to and str(reply_to),
+            'in_reply_to_user_id_str': None,
+            'in_reply_to_screen_name': None,
+            'user': {'id': user_id,
+                     'id_str': str(user_id),
+                     'name': 'User %d' % user_id,
+                     'screen_name': 'user%d' % user_id,
+                     'description': 'A generated user',
+                     'followers_count': 10,
+                     'profile_image_url_https':
+                     'https://example.com/%d.png' % user_id},
+            'entities': {'hashtags': [{'text': 'sugar', 'indices': [0, 6]}],
+                         'urls': [],
+                         'user_mentions': []}}
+
+
+def make_page(params, text_size, users, reply_to=None):
+    count = min(int(params.get('count', 20)), 200)
+    since_id = int(params.get('since_id', 0))
+    top_id = int(params.get('max_id', TOP_ID))
+
+    return [make_tweet(tweet_id, text_size, users, reply_to)
+            for tweet_id in xrange(top_id, max(since_id, top_id - count), -1)]
+
+
+class MockConfig:
+
+    def __init__(self, latency=0, jitter=0, tweets=20, text_size=140,
+                 users=20, rate_limit=None, window=900, error_rate=0.0,
+                 error_code=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.tweets = tweets
+        self.text_size = text_size
+        self.users = users
+        self.rate_limit = rate_limit
+        self.window = window
+        self.error_rate = error_rate
+        self.error_code = error_code
+
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.requests = 0
+        self.errors = 0
+        self.media_id = 0
+
+    def take(self, family):
+        """ Returns (allowed, limit, remaining, reset) for one more call.
+
+        Like the real API a limit of N serves N calls, the one after
+        them is refused and spends nothing.
+        """
+        with self.lock:
+            self.requests += 1
+            now = int(time.time())
+            remaining, reset = self.budgets.get(family,
+                                                (self.rate_limit, 0))
+            if reset <= now:
+                remaining, reset = self.rate_limit, now + self.window
+            allowed = remaining > 0
+            if allowed:
+                remaining -= 1
+            self.budgets[family] = (remaining, reset)
+            return allowed, self.rate_limit, remaining, reset
+
+    def next_media_id(self):
+        with self.lock:
+            self.media_id += 1
+            return self.media_id
+
+
+class MockHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        self._handle('GET', url.path, dict(urlparse.parse_qsl(url.query)))
+
+    def do_POST(self):
+        # curl waits for this before sending larger bodies
+        if self.headers.get('expect', '').lower() == '100-continue':
+            self.wfile.write('HTTP/1.1 100 Continue\r\n\r\n')
+
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+
+        content_type = self.headers.get('content-type', '')
+        if content_type.startswith('multipart/form-data'):
+            form = cgi.FieldStorage(fp=self.rfile, headers=self.headers,
+                                    environ={'REQUEST_METHOD': 'POST',
+                                             'CONTENT_TYPE': content_type})
+            for name in form.keys():
+                if not form[name].filename:
+                    params[name] = form.getfirst(name)
+        else:
+            body = self.rfile.read(int(self.headers.get('content-length', 0)))
+            params.update(urlparse.parse_qsl(body))
+
+        self._handle('POST', url.path, params)
+
+    def _handle(self, method, path, params):
+        config = self.server.config
+
+        delay = config.latency + random.uniform(0, config.jitter)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        family = '/'.join(path.strip('/').split('/')[1:]).split('.')[0]
+        headers = {}
+
+        if config.rate_limit is not None:
+            allowed, limit, remaining, reset = config.take(family)
+            headers = {'x-rate-limit-limit': str(limit),
+                       'x-rate-limit-remaining': str(remaining),
+                       'x-rate-limit-reset': str(reset)}
+            if not allowed:
+                self._send(429, {'errors': [{'code': 88,
+                                             'message': 'Rate limit'}]},
+                           headers)
+                return
+        else:
+            with config.lock:
+                config.requests += 1
+
+        if random.random() < config.error_rate:
+            with config.lock:
+                config.errors += 1
+            self._send(config.error_code,
+                       {'errors': [{'code': 131, 'message': 'Injected'}]},
+                       headers)
+            return
+
+        code, body = self._answer(method, path, params)
+        self._send(code, body, headers)
+
+    def _answer(self, method, path, params):
+        config = self.server.config
+        page = {'count': config.tweets}
+        page.update(params)
+
+        if path.startswith('/oauth/'):
+            return 200, 'oauth_token=mock&oauth_token_secret=mock'
+
+        if path.endswith('/statuses/mentions_timeline.json'):
+            return 200, make_page(page, config.text_size, config.users,
+                                  SHARED_ID)
+
+        if path.endswith('/statuses/home_timeline.json'):
+            return 200, make_page(page, config.text_size, config.users)
+
+        if path.endswith('/search/tweets.json'):
+            return 200, {'statuses': make_page(page, config.text_size,
+                                               config.users),
+                         'search_metadata': {'query': params.get('q')}}
+
+        if path.endswith('/statuses/show.json'):
+            return 200, make_tweet(int(params['id']), config.text_size,
+                                   config.users)
+
+        if path.endswith('/statuses/lookup.json'):
+            return 200, [make_tweet(int(status_id), config.text_size,
+                                    config.users)
+                         for status_id in params['id'].split(',')]
+
+        if path.endswith('/media/upload.json'):
+            return self._media(params)
+
+        if method == 'POST' and '/statuses/' in path:
+            tweet_id = TOP_ID + config.next_media_id()
+            return 200, make_tweet(tweet_id, config.text_size, config.users)
+
+        return 404, {'errors': [{'code': 34, 'message': 'Not found'}]}
+
+    def _media(self, params):
+        command = params.get('command')
+
+        if command == 'INIT':
+            media_id = self.server.config.next_media_id()
+            return 202, {'media_id': media_id,
+                         'media_id_string': str(media_id),
+                         'expires_after_secs': 86400}
+        if command == 'APPEND':
+            return 204, ''
+        if command == 'FINALIZE':
+            return 201, {'media_id': int(params['media_id']),
+                         'media_id_string': params['media_id']}
+
+        return 400, {'errors': [{'code': 38, 'message': 'No command'}]}
+
+    def _send(self, code, body, headers):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+
+        self.send_response(code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockTwitter(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, config, host='127.0.0.1', port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), MockHandler)
+        self.config = config
+        self.url = 'http://%s:%d' % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0,
+                        help='milliseconds added to every answer')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='up to this many more random milliseconds')
+    parser.add_argument('--tweets', type=int, default=20,
+                        help='statuses per page when no count is given')
+    parser.add_argument('--text-size', type=int, default=140,
+                        help='characters per status text')
+    parser.add_argument('--users', type=int, default=20,
+                        help='distinct authors across statuses')
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='calls per endpoint and window, none by default')
+    parser.add_argument('--window', type=int, default=900,
+                        help='rate limit window in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of calls answered with --error-code')
+    parser.add_argument('--error-code', type=int, default=503)
+
+
+def config_from(args):
+    return MockConfig(args.latency, args.jitter, args.tweets, args.text_size,
+                      args.users, args.rate_limit, args.window,
+                      args.error_rate, args.error_code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Twitter API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockTwitter(config_from(args), args.host, args.port)
+    print 'Serving on %s' % server.url
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
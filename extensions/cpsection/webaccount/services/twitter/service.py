@@ -16,33 +16,23 @@
 
 import logging
 
-from gi.repository import GConf
 from gi.repository import Gtk
-from gi.repository import WebKit
 from gettext import gettext as _
 
 from web.twitter.twitter.twr_oauth import TwrOauth
 from web.twitter.twitter.twr_account import TwrAccount
-from web.twitter.account import TwitterOnlineAccount as twr
+from web.twitter.twitter.twr_credentials import TwrCredentials
 from cpsection.webservices.web_service import WebService
 
 
 class TwitterService(WebService):
 
     def __init__(self):
-        self._client = GConf.Client.get_default()
-
-        tokens = self._twr_tokens()
-        self._consumer_token = tokens[0]
-        self._consumer_secret = tokens[1]
-        self._access_token = tokens[2]
-        self._access_secret = tokens[3]
+        # the tokens are read when the service is configured
+        self._credentials = TwrCredentials.get_default()
 
     def _twr_tokens(self):
-        return (self._client.get_string(twr.CONSUMER_TOKEN_KEY),
-                self._client.get_string(twr.CONSUMER_SECRET_KEY),
-                self._client.get_string(twr.ACCESS_TOKEN_KEY),
-                self._client.get_string(twr.ACCESS_SECRET_KEY))
+        return self._credentials.get_tokens()
 
     def _twr_save_access_cb(self, oauth, data, container):
         logging.debug('_twr_save_access_cb')
@@ -50,23 +40,23 @@ class TwitterService(WebService):
         self._access_token = data['oauth_token']
         self._access_secret = data['oauth_token_secret']
 
-        # XXX update step 3
-        TwrAccount.set_secrets(self._consumer_token, self._consumer_secret,
-                           self._access_token, self._access_secret)
-
-        self._client.set_string(twr.CONSUMER_TOKEN_KEY, self._consumer_token)
-        self._client.set_string(twr.CONSUMER_SECRET_KEY, self._consumer_secret)
-        self._client.set_string(twr.ACCESS_TOKEN_KEY, self._access_token)
-        self._client.set_string(twr.ACCESS_SECRET_KEY, self._access_secret)
+        # XXX update step 3, saved and pushed to TwrAccount
+        self._credentials.set_tokens(self._consumer_token,
+                                     self._consumer_secret,
+                                     self._access_token,
+                                     self._access_secret)
 
         self._twr_configured(container)
 
     def _twr_verify_cb(self, oauth, data, container):
         logging.debug('_twr_verify_cb')
 
-        # XXX update step 2
-        TwrAccount.set_secrets(self._consumer_token, self._consumer_secret,
-                           data['oauth_token'], data['oauth_token_secret'])
+        # XXX update step 2, signs only this flow, nothing else sees it
+        account = TwrAccount(self._consumer_token, self._consumer_secret,
+                             data['oauth_token'], data['oauth_token_secret'])
+
+        # only needed to authorize, WebKit is slow to load
+        from gi.repository import WebKit
 
         url = TwrOauth.AUTHORIZATION_URL % data['oauth_token']
         wkv = WebKit.WebView()
@@ -86,7 +76,7 @@ class TwitterService(WebService):
         # XXX should I move it out?
         def _button_cb(button):
             verifier = entry.get_text()
-            oauth = TwrOauth()
+            oauth = TwrOauth(account)
             oauth.connect('access-downloaded',
                             self._twr_save_access_cb, container)
             oauth.connect('access-downloaded-failed',
@@ -141,11 +131,16 @@ class TwitterService(WebService):
             self._twr_configured(container)
             return
 
+        self._consumer_token = tokens[0]
+        self._consumer_secret = tokens[1]
+        self._access_token = tokens[2]
+        self._access_secret = tokens[3]
+
         # XXX update step 1
-        TwrAccount.set_secrets(self._consumer_token, self._consumer_secret,
-                           self._access_token, self._access_secret)
- 
-        oauth = TwrOauth()
+        account = TwrAccount(self._consumer_token, self._consumer_secret,
+                             self._access_token, self._access_secret)
+
+        oauth = TwrOauth(account)
         oauth.connect('request-downloaded', self._twr_verify_cb, container)
         oauth.connect('request-downloaded-failed',
                         self._twr_failed_cb, container)
@@ -22,16 +22,19 @@
 
 from gettext import gettext as _
 import logging
-import os
-import tempfile
 import time
 import json
+import Queue
+import bisect
+import hashlib
+import threading
+
+from collections import OrderedDict
 
 from gi.repository import Gtk
-from gi.repository import GdkPixbuf
-from gi.repository import GConf
 from gi.repository import GObject
 
+from sugar3 import env
 from sugar3.datastore import datastore
 from sugar3.graphics.alert import NotifyAlert
 from sugar3.graphics.icon import Icon
@@ -39,9 +42,14 @@ from sugar3.graphics.icon import Icon
 from jarabe.journal import journalwindow
 from jarabe.web import account
 
-from twitter.twr_account import TwrAccount
-from twitter.twr_status import TwrStatus
-from twitter.twr_timeline import TwrTimeline
+from twitter.twitter import TwrTimeline
+from twitter.twr_pager import TwrPager
+from twitter.twr_models import TwrProjection
+from twitter.twr_store import TwrStore
+from twitter.twr_ratelimit import TwrRateLimiter
+from twitter.twr_outbox import TwrOutbox
+from twitter.twr_trace import span
+from twitter.twr_credentials import TwrCredentials
 
 ACCOUNT_NEEDS_ATTENTION = 0
 ACCOUNT_ACTIVE = 1
@@ -49,30 +57,108 @@ ACCOUNT_NAME = _('Twitter')
 COMMENTS = 'comments'
 COMMENT_IDS = 'twr_comment_ids'
 COMMENT_LAST_ID = 'last_comment_id'
+COMMENT_COUNT = 'twr_comment_count'
+COMMENT_STORE = 'twr_comment_store'
+STORE_NAME = 'twitter.db'
+OUTBOX_NAME = 'twitter-outbox'
+MENTIONS_WATERMARK = 'mentions'
+HOME_WATERMARK = 'home'
+
+# all the store and the comments ever look at
+TWEET_PROJECTION = TwrProjection(('id_str', 'in_reply_to_status_id_str',
+                                  'text', 'created_at'),
+                                 ('name',))
+
+_store = None
+_outbox = None
+_account = None
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        _store = TwrStore(env.get_profile_path(STORE_NAME))
+    return _store
+
+
+def _get_outbox():
+    global _outbox
+    if _outbox is None:
+        _outbox = TwrOutbox(env.get_profile_path(OUTBOX_NAME))
+        _outbox.connect('item-sent', _outbox_item_sent_cb)
+        _outbox.connect('item-failed', _outbox_item_failed_cb)
+    return _outbox
+
+
+def _outbox_item_sent_cb(outbox, item, info):
+    if item['data'] is None:
+        return
+    # a duplicate answer tells it went out, not as what
+    if 'id_str' not in info:
+        logging.warning('_outbox_item_sent_cb %s sent without id',
+                        item['key'])
+        return
+    try:
+        ds_object = datastore.get(item['data']['uid'])
+        ds_object.metadata['twr_object_id'] = info['id_str']
+        with span('datastore.write', uid=item['data']['uid']):
+            datastore.write(ds_object, update_mtime=False)
+        _TwitterMentionsSync.get_default().add_entry(ds_object.metadata)
+    except Exception as e:
+        logging.debug('_outbox_item_sent_cb failed to write: %s', str(e))
+
+
+def _outbox_item_failed_cb(outbox, item, message):
+    logging.error('_outbox_item_failed_cb %s %s', item['key'], message)
 
 
 class TwitterAccount(account.Account):
 
-    CONSUMER_TOKEN_KEY = "/desktop/sugar/collaboration/twitter_consumer_token"
-    CONSUMER_SECRET_KEY = "/desktop/sugar/collaboration/twitter_consumer_secret"
-    ACCESS_TOKEN_KEY = "/desktop/sugar/collaboration/twitter_access_token"
-    ACCESS_SECRET_KEY = "/desktop/sugar/collaboration/twitter_access_secret"
+    CONSUMER_TOKEN_KEY = TwrCredentials.CONSUMER_TOKEN_KEY
+    CONSUMER_SECRET_KEY = TwrCredentials.CONSUMER_SECRET_KEY
+    ACCESS_TOKEN_KEY = TwrCredentials.ACCESS_TOKEN_KEY
+    ACCESS_SECRET_KEY = TwrCredentials.ACCESS_SECRET_KEY
+
+    # seconds after the Journal starts before anything else happens
+    STARTUP_DELAY = 30
 
     def __init__(self):
-        self._client = GConf.Client.get_default()
-        ctoken, csecret, atoken, asecret = self._access_tokens()
-        TwrAccount.set_secrets(ctoken, csecret, atoken, asecret)
+        self._credentials = TwrCredentials.get_default()
+        self._credentials.connect('changed', self.__credentials_changed_cb)
         self._alert = None
+        self._started = False
+
+        GObject.timeout_add_seconds(self.STARTUP_DELAY, self.__startup_cb)
+
+    def __startup_cb(self):
+        self._started = True
+        self._update_sync()
+        return False
+
+    def __credentials_changed_cb(self, credentials):
+        # before startup, __startup_cb will look at them anyway
+        if self._started:
+            self._update_sync()
+
+    def _update_sync(self):
+        if not self.is_active():
+            if _TwitterSyncDaemon._default is not None:
+                _TwitterSyncDaemon._default.stop()
+            return
+
+        _TwitterSyncDaemon.get_default().start()
+        # sends whatever was queued before the restart
+        _get_outbox()
 
     def get_description(self):
         return ACCOUNT_NAME
 
     def is_configured(self):
-        return None not in self._access_tokens()
+        return self._credentials.is_configured()
 
     def is_active(self):
         # No expiration date
-        return None not in self._access_tokens()
+        return self._credentials.is_configured()
 
     def get_share_menu(self, journal_entry_metadata):
         twr_share_menu = _TwitterShareMenu(journal_entry_metadata,
@@ -81,10 +167,14 @@ class TwitterAccount(account.Account):
         return twr_share_menu
 
     def get_refresh_menu(self):
-        twr_refresh_menu = _TwitterRefreshMenu(self.is_active())
+        twr_refresh_menu = _TwitterRefreshMenu(self.is_active(),
+                                               self.get_mentions_sync())
         self._connect_transfer_signals(twr_refresh_menu)
         return twr_refresh_menu
 
+    def get_mentions_sync(self):
+        return _TwitterMentionsSync.get_default()
+
     def _connect_transfer_signals(self, transfer_widget):
         transfer_widget.connect('transfer-state-changed',
                                 self._transfer_state_changed_cb)
@@ -107,12 +197,6 @@ class TwitterAccount(account.Account):
         journalwindow.get_journal_window().remove_alert(alert)
         self._alert = None
 
-    def _access_tokens(self):
-        return (self._client.get_string(self.CONSUMER_TOKEN_KEY),
-                self._client.get_string(self.CONSUMER_SECRET_KEY),
-                self._client.get_string(self.ACCESS_TOKEN_KEY),
-                self._client.get_string(self.ACCESS_SECRET_KEY))
-
 
 class _TwitterShareMenu(account.MenuItem):
     __gtype_name__ = 'JournalTwitterMenu'
@@ -138,57 +222,116 @@ class _TwitterShareMenu(account.MenuItem):
             return self._metadata[key]
         return default_value
 
-    def _status_updated_cb(self, status, data, tmp_file):
-        if os.path.exists(tmp_file):
-            os.unlink(tmp_file)
-        try:
-            ds_object = datastore.get(self._metadata['uid'])
-            ds_object.metadata['twr_object_id'] = status._status_id
-            datastore.write(ds_object, update_mtime=False)
-        except Exception as e:
-            logging.debug('_status_updated_cb failed to write: %s', str(e))
-
-    def _status_updated_failed_cb(self, status, message, tmp_file):
-        if os.path.exists(tmp_file):
-            os.unlink(tmp_file)
-        logging.error('_status_updated_failed_cb %s', message)
-            
     def _twitter_share_menu_cb(self, menu_item):
         logging.debug('_twitter_share_menu_cb')
 
         self.emit('transfer-state-changed', _('Download started'))
-        tmp_file = tempfile.mktemp()
-        self._image_file_from_metadata(tmp_file)
-
-        status = TwrStatus()
-        status.connect('status-updated', self._status_updated_cb, tmp_file)
-        status.connect('status-updated-failed',
-                        self._status_updated_failed_cb, tmp_file)
-        status.update_with_media(self._comment, tmp_file)
-
-    def _image_file_from_metadata(self, image_path):
-        """ Load a pixbuf from a Journal object. """
-        pixbufloader = \
-            GdkPixbuf.PixbufLoader.new_with_mime_type('image/png')
-        pixbufloader.set_size(300, 225)
+        _TwitterPreviewCache.get_default().render(
+            self._metadata['uid'], self._get_metadata_by_key('preview', None),
+            self._preview_rendered_cb)
+
+    def _preview_rendered_cb(self, buffer):
+        # sharing the same entry again while it is still queued is a no-op
+        uid = self._metadata['uid']
+        _get_outbox().update(self._comment, buffer=buffer,
+                             key='share-%s' % uid, data={'uid': uid})
+
+
+class _TwitterPreviewCache(object):
+    """ Share previews scaled and encoded to PNG in a worker thread.
+
+    Encoded previews are kept by journal uid and preview hash, so sharing
+    an entry again does not decode it again.
+    """
+
+    WIDTH = 300
+    HEIGHT = 225
+    MAX_ENTRIES = 16
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = _TwitterPreviewCache()
+        return cls._default
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._waiting = {}
+        self._jobs = Queue.Queue()
+        self._worker = None
+
+    def render(self, uid, preview, callback):
+        """ Calls back with the PNG buffer, or None, from the main loop. """
+        if preview is None:
+            GObject.idle_add(callback, None)
+            return
+
+        preview = str(preview)
+        key = (uid, hashlib.sha1(preview).hexdigest())
+
+        buffer = self._cache.pop(key, None)
+        if buffer is not None:
+            self._cache[key] = buffer
+            GObject.idle_add(callback, buffer)
+            return
+
+        if key in self._waiting:
+            self._waiting[key].append(callback)
+            return
+
+        self._waiting[key] = [callback]
+        self._jobs.put((key, preview))
+
+        if self._worker is None:
+            GObject.threads_init()
+            self._worker = threading.Thread(target=self._work)
+            self._worker.daemon = True
+            self._worker.start()
+
+    def _work(self):
+        while True:
+            key, preview = self._jobs.get()
+            GObject.idle_add(self._rendered, key, self._encode(preview))
+
+    def _encode(self, preview):
+        from gi.repository import GdkPixbuf
+
+        loader = GdkPixbuf.PixbufLoader.new_with_mime_type('image/png')
+        loader.set_size(self.WIDTH, self.HEIGHT)
         try:
-            pixbufloader.write(self._metadata['preview'])
-            pixbuf = pixbufloader.get_pixbuf()
-        except Exception as ex:
-            logging.debug("_image_file_from_metadata: %s" % (str(ex)))
-            pixbuf = None
+            loader.write(preview)
+            loader.close()
+            success, buffer = loader.get_pixbuf().save_to_bufferv('png',
+                                                                  [], [])
+        except Exception as e:
+            logging.debug('_TwitterPreviewCache._encode: %s', str(e))
+            return None
+
+        if not success:
+            return None
+        return buffer
+
+    def _rendered(self, key, buffer):
+        if buffer is not None:
+            self._cache[key] = buffer
+            while len(self._cache) > self.MAX_ENTRIES:
+                self._cache.popitem(last=False)
 
-        pixbufloader.close()
-        if pixbuf:
-            pixbuf.savev(image_path, 'png', [], [])
+        for callback in self._waiting.pop(key, []):
+            callback(buffer)
+        return False
 
 
 class _TwitterRefreshMenu(account.MenuItem):
-    def __init__(self, is_active):
+    def __init__(self, is_active, mentions_sync):
         account.MenuItem.__init__(self, ACCOUNT_NAME)
 
         self._is_active = is_active
         self._metadata = None
+        self._mentions_sync = mentions_sync
+        self._sync_handlers = []
 
         if is_active:
             icon_name = 'twitter-refresh'
@@ -202,6 +345,13 @@ class _TwitterRefreshMenu(account.MenuItem):
 
     def set_metadata(self, metadata):
         self._metadata = metadata
+
+        # whatever the background sync already stored shows right away
+        if self._metadata and 'twr_object_id' in self._metadata:
+            comments = self._mentions_sync.get_comments(self._metadata['uid'])
+            if comments:
+                self.emit('comments-changed', json.dumps(comments))
+
         if self._is_active:
             if self._metadata:
                 if 'fb_object_id' in self._metadata:
@@ -226,58 +376,384 @@ class _TwitterRefreshMenu(account.MenuItem):
 
         self.emit('transfer-state-changed', _('Download started'))
 
-        status_id = self._metadata['twr_object_id']
+        self._mentions_sync.add_entry(self._metadata)
 
-        # XXX is there other way to update metadata?
-        ds_object = datastore.get(self._metadata['uid'])
-        if COMMENT_LAST_ID in ds_object.metadata:
-            status_id = ds_object.metadata[COMMENT_LAST_ID]
+        if not self._sync_handlers:
+            sync = self._mentions_sync
+            self._sync_handlers = [
+                sync.connect('comments-changed', self._comments_changed_cb),
+                sync.connect('sync-completed', self._sync_completed_cb),
+                sync.connect('sync-failed',
+                             self._twr_comments_download_failed_cb)]
 
-        timeline = TwrTimeline()
-        timeline.connect('mentions-downloaded', self._twr_mentions_downloaded_cb)
-        timeline.mentions_timeline(since_id=status_id)
+        self._mentions_sync.refresh()
 
-    def _twr_mentions_downloaded_cb(self, timeline, comments):
-        logging.debug('_twr_mentions_downloaded_cb')
+    def _comments_changed_cb(self, sync, uid, comments):
+        if uid == self._metadata['uid']:
+            self.emit('comments-changed', comments)
 
-        ds_object = datastore.get(self._metadata['uid'])
-        if not COMMENTS in ds_object.metadata:
-            ds_comments = []
-        else:
-            ds_comments = json.loads(ds_object.metadata[COMMENTS])
-        if not COMMENT_IDS in ds_object.metadata:
-            ds_comment_ids = []
-        else:
-            ds_comment_ids = json.loads(ds_object.metadata[COMMENT_IDS])
+    def _sync_completed_cb(self, sync):
+        for handler in self._sync_handlers:
+            sync.disconnect(handler)
+        self._sync_handlers = []
 
-        comment_id = None
-        new_comment = False
-        for comment in comments:
-            # XXX hope for a better API
-            if comment['in_reply_to_status_id_str'] != self._metadata['twr_object_id']:
-               continue
-
-            if comment['id_str'] not in ds_comment_ids:
-                ds_comments.append({'from': comment['user']['name'],
-                                    'message': comment['text'],
-                                    'icon': 'twitter-share'})
-                ds_comment_ids.append(comment['id_str'])
-
-                # XXX keep the latest one
-                if comment['id_str'] > comment_id:
-                    comment_id = comment['id_str']        
-                new_comment = True
-
-        if new_comment:
-            ds_object.metadata[COMMENT_LAST_ID] = comment_id
-            ds_object.metadata[COMMENTS] = json.dumps(ds_comments)
-            ds_object.metadata[COMMENT_IDS] = json.dumps(ds_comment_ids)
-            self.emit('comments-changed', ds_object.metadata[COMMENTS])
-
-        datastore.write(ds_object, update_mtime=False)
-
-    def _twr_comments_download_failed_cb(self, tweet, failed_reason):
+    def _twr_comments_download_failed_cb(self, sync, failed_reason):
         logging.debug('_twr_comments_download_failed_cb: %s' % (failed_reason))
+        self._sync_completed_cb(sync)
+
+
+class _TwitterMentionsSync(GObject.GObject):
+    """ Fetches mentions once and dispatches replies to every shared entry.
+    """
+
+    __gsignals__ = {
+        'comments-changed': (GObject.SignalFlags.RUN_FIRST,
+                             None, ([str, str])),
+        'sync-completed':   (GObject.SignalFlags.RUN_FIRST,
+                             None, ([])),
+        'sync-failed':      (GObject.SignalFlags.RUN_FIRST,
+                             None, ([str]))}
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = _TwitterMentionsSync()
+        return cls._default
+
+    def __init__(self):
+        GObject.GObject.__init__(self)
+        self._pager = None
+        self._changed = set()
+        self._indexes = {}
+        self._count = 0
+
+    def get_count(self):
+        # mentions downloaded by the last refresh
+        return self._count
+
+    def get_comments(self, uid):
+        return list(self._index(_get_store(), uid).comments())
+
+    def add_entry(self, metadata):
+        store = _get_store()
+        status_id = metadata['twr_object_id']
+
+        if not store.add_entry(status_id, metadata['uid']):
+            return
+
+        # replies older than the watermark were never fetched for it
+        watermark = store.get_watermark(MENTIONS_WATERMARK)
+        if watermark is not None and int(status_id) < int(watermark):
+            store.set_watermark(MENTIONS_WATERMARK, status_id)
+
+        if COMMENT_IDS in metadata:
+            self._migrate_comments(store, metadata)
+
+    def refresh(self):
+        if self._pager is not None:
+            return
+
+        self._count = 0
+        store = _get_store()
+        since_id = store.get_watermark(MENTIONS_WATERMARK)
+        if since_id is None:
+            since_id = store.oldest_entry()
+        if since_id is None:
+            self.emit('sync-completed')
+            return
+
+        self._pager = TwrPager(TwrPager.MENTIONS, since_id=since_id,
+                               projection=TWEET_PROJECTION)
+        self._pager.connect('page-downloaded', self.__page_downloaded_cb)
+        self._pager.connect('pages-completed', self.__pages_completed_cb)
+        self._pager.connect('pages-downloaded-failed',
+                            self.__pages_failed_cb)
+        self._pager.start()
+
+    def __page_downloaded_cb(self, pager, comments):
+        logging.debug('_TwitterMentionsSync.__page_downloaded_cb')
+
+        self._count += len(comments)
+        store = _get_store()
+
+        replies = {}
+        for comment in comments:
+            status_id = comment['in_reply_to_status_id_str']
+            if status_id is not None:
+                replies.setdefault(status_id, []).append(comment)
+
+        for status_id, uid in store.entries(replies.keys()).items():
+            fresh = self._index(store, uid).merge(replies[status_id])
+            if fresh:
+                store.add(fresh, uid)
+                self._changed.add(uid)
+
+    def __pages_completed_cb(self, pager, newest_id):
+        store = _get_store()
+
+        if newest_id is not None:
+            store.set_watermark(MENTIONS_WATERMARK, newest_id)
+
+        self._pager = None
+        self._write_changed(store)
+        self.emit('sync-completed')
+
+    def __pages_failed_cb(self, pager, message):
+        # keep what arrived, the watermark stays so it is fetched again
+        self._pager = None
+        self._write_changed(_get_store())
+        self.emit('sync-failed', message)
+
+    def _write_changed(self, store):
+        changed = self._changed
+        self._changed = set()
+
+        for uid in changed:
+            index = self._index(store, uid)
+
+            # the comments live in the store, metadata only points there
+            values = {COMMENT_STORE: store.path,
+                      COMMENT_COUNT: str(len(index)),
+                      COMMENT_LAST_ID: str(index.last_id)}
+
+            try:
+                ds_object = datastore.get(uid)
+                metadata = ds_object.metadata
+
+                dirty = COMMENT_IDS in metadata
+                if dirty:
+                    del metadata[COMMENT_IDS]
+
+                for key, value in values.items():
+                    if metadata.get(key) != value:
+                        metadata[key] = value
+                        dirty = True
+
+                if dirty:
+                    with span('datastore.write', uid=uid):
+                        datastore.write(ds_object, update_mtime=False)
+            except Exception as e:
+                logging.debug('_write_changed failed to write: %s', str(e))
+                continue
+
+            self.emit('comments-changed', uid, json.dumps(index.comments()))
+
+    def _index(self, store, uid):
+        if uid not in self._indexes:
+            self._indexes[uid] = _TwitterCommentIndex(store.replies(uid))
+        return self._indexes[uid]
+
+    def _migrate_comments(self, store, metadata):
+        # XXX comments used to be kept as JSON lists in the metadata
+        ds_comments = json.loads(metadata.get(COMMENTS, '[]'))
+        ds_comment_ids = json.loads(metadata[COMMENT_IDS])
+
+        tweets = [{'id_str': comment_id,
+                   'in_reply_to_status_id_str': metadata['twr_object_id'],
+                   'user': {'name': comment['from']},
+                   'text': comment['message']}
+                  for comment_id, comment in zip(ds_comment_ids, ds_comments)]
+
+        fresh = self._index(store, metadata['uid']).merge(tweets)
+        store.add(fresh, metadata['uid'])
+
+        self._changed.add(metadata['uid'])
+
+
+class _TwitterCommentIndex(object):
+    """ The comments of one entry, ordered by numeric status id.
+
+    Kept in memory in front of the store, so a refresh only looks at the
+    mentions it downloaded and not at everything the entry ever got.
+    """
+
+    def __init__(self, rows):
+        self._ids = set()
+        self._keys = []
+        self._comments = []
+        self.last_id = None
+
+        # rows come ordered by id
+        for id_str, user_name, text in rows:
+            self._ids.add(id_str)
+            self._keys.append(int(id_str))
+            self._comments.append(self._comment(user_name, text))
+
+        if self._keys:
+            self.last_id = self._keys[-1]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def comments(self):
+        return self._comments
+
+    def merge(self, tweets):
+        """ Adds the tweets not seen yet and returns them, oldest first. """
+        fresh = {}
+        for tweet in tweets:
+            if tweet['id_str'] not in self._ids:
+                fresh[tweet['id_str']] = tweet
+
+        fresh = sorted(fresh.values(), key=lambda tweet: int(tweet['id_str']))
+
+        for tweet in fresh:
+            key = int(tweet['id_str'])
+            comment = self._comment(tweet['user']['name'], tweet['text'])
+
+            # new mentions are almost always newer than all the others
+            if self.last_id is None or key > self.last_id:
+                self._keys.append(key)
+                self._comments.append(comment)
+                self.last_id = key
+            else:
+                position = bisect.bisect(self._keys, key)
+                self._keys.insert(position, key)
+                self._comments.insert(position, comment)
+
+            self._ids.add(tweet['id_str'])
+
+        return fresh
+
+    def _comment(self, user_name, text):
+        return {'from': user_name,
+                'message': text,
+                'icon': 'twitter-share'}
+
+
+class _TwitterSyncDaemon(GObject.GObject):
+    """ Polls mentions and the home timeline in the background.
+
+    Polls get further apart while nothing new arrives and closer when
+    there is activity, and wait for the window to reset when the rate
+    budget runs low.
+    """
+
+    MIN_INTERVAL = 60
+    MAX_INTERVAL = 15 * 60
+    # calls left for the user's own refreshes
+    RESERVE = 2
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = _TwitterSyncDaemon(
+                _TwitterMentionsSync.get_default())
+        return cls._default
+
+    def __init__(self, mentions_sync):
+        GObject.GObject.__init__(self)
+
+        self._mentions_sync = mentions_sync
+        self._mentions_sync.connect('sync-completed',
+                                    self.__mentions_completed_cb)
+        self._mentions_sync.connect('sync-failed',
+                                    self.__mentions_failed_cb)
+
+        self._interval = self.MIN_INTERVAL
+        self._timeout_id = None
+        self._pending = set()
+        self._new = 0
+
+    def start(self):
+        if self._timeout_id is None and not self._pending:
+            self._schedule(self.MIN_INTERVAL)
+
+    def stop(self):
+        if self._timeout_id is not None:
+            GObject.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+    def _schedule(self, interval):
+        self._timeout_id = GObject.timeout_add_seconds(interval,
+                                                       self.__tick_cb)
+
+    def _budget_delay(self):
+        delay = 0
+        limiter = TwrRateLimiter.get_default()
+
+        for url in (TwrTimeline.MENTIONS_TIMELINE_URL,
+                    TwrTimeline.HOME_TIMELINE_URL):
+            budget = limiter.budget(url)
+            if budget is not None and budget['remaining'] <= self.RESERVE:
+                delay = max(delay, int(budget['reset'] - time.time()) + 1)
+
+        return delay
+
+    def __tick_cb(self):
+        self._timeout_id = None
+
+        delay = self._budget_delay()
+        if delay > 0:
+            logging.debug('_TwitterSyncDaemon waits %d seconds', delay)
+            self._schedule(delay)
+            return False
+
+        self._new = 0
+        self._pending = set([MENTIONS_WATERMARK, HOME_WATERMARK])
+
+        self._mentions_sync.refresh()
+        self._refresh_home()
+
+        return False
+
+    def _refresh_home(self):
+        since_id = _get_store().get_watermark(HOME_WATERMARK)
+
+        # the first time only the latest page is worth having
+        max_pages = None
+        if since_id is None:
+            max_pages = 1
+
+        pager = TwrPager(TwrPager.HOME, since_id=since_id,
+                         max_pages=max_pages, projection=TWEET_PROJECTION)
+        pager.connect('page-downloaded', self.__home_downloaded_cb)
+        pager.connect('pages-completed', self.__home_completed_cb)
+        pager.connect('pages-downloaded-failed', self.__home_failed_cb)
+        pager.start()
+
+    def __home_downloaded_cb(self, pager, tweets):
+        self._new += _get_store().add(tweets)
+
+    def __home_completed_cb(self, pager, newest_id):
+        if newest_id is not None:
+            _get_store().set_watermark(HOME_WATERMARK, newest_id)
+        self._done(HOME_WATERMARK)
+
+    def __home_failed_cb(self, pager, message):
+        logging.debug('_TwitterSyncDaemon home failed: %s', message)
+        self._done(HOME_WATERMARK)
+
+    def __mentions_completed_cb(self, sync):
+        self._new += sync.get_count()
+        self._done(MENTIONS_WATERMARK)
+
+    def __mentions_failed_cb(self, sync, message):
+        logging.debug('_TwitterSyncDaemon mentions failed: %s', message)
+        self._done(MENTIONS_WATERMARK)
+
+    def _done(self, name):
+        if name not in self._pending:
+            return
+
+        self._pending.remove(name)
+        if self._pending:
+            return
+
+        if self._new > 0:
+            self._interval = max(self.MIN_INTERVAL, self._interval / 2)
+        else:
+            self._interval = min(self.MAX_INTERVAL, self._interval * 2)
+
+        self._schedule(self._interval)
+
 
 def get_account():
-    return TwitterAccount()
+    global _account
+    if _account is None:
+        _account = TwitterAccount()
+    return _account
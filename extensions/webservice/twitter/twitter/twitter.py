@@ -18,84 +18,84 @@
 import json
 import urllib
 import time
-import random
+import mimetypes
+import os
 import hashlib
-import hmac
-import binascii
-import pycurl
 
 from gi.repository import GObject
 from urlparse import parse_qsl
-
-
-class TwrAccount:
+from urlparse import urlparse
+
+from twr_multi import TwrMulti
+from twr_multi import get_pycurl
+from twr_pool import TwrPool
+from twr_stream import TwrJsonStream
+from twr_ratelimit import TwrRateLimiter
+from twr_ratelimit import endpoint_family
+from twr_retry import TwrRetryPolicy
+from twr_signer import TwrSigner
+from twr_signer import encode_params
+from twr_cache import TwrCache
+from twr_cache import cache_key
+from twr_stats import TwrStats
+from twr_trace import span
+
+# both can point somewhere else, ie. the mock server in benchmarks/
+API_BASE = os.environ.get('TWR_API_BASE', 'https://api.twitter.com')
+UPLOAD_BASE = os.environ.get('TWR_UPLOAD_BASE',
+                             os.environ.get('TWR_API_BASE',
+                                            'https://upload.twitter.com'))
+
+
+class TwrAccount(object):
+    """ One identity to sign requests as.
+
+    Instances are immutable and carry their own signer, so any number of
+    them can be used side by side, ie. passed as account= to TwrOauth,
+    TwrSearch, TwrStatus, TwrTimeline or TwrPager. Whatever is given no
+    account signs as the default one, set through set_secrets.
+    """
+
+    __slots__ = ('consumer_key', 'access_key', 'id', '_signer')
+
+    _default = None
+
+    def __init__(self, c_key, c_secret, a_key, a_secret):
+        # secrets never leave the signer, the id is safe to log or store
+        account_id = hashlib.sha1('%s&%s' % (c_key, a_key)).hexdigest()[:16]
+
+        object.__setattr__(self, 'consumer_key', c_key)
+        object.__setattr__(self, 'access_key', a_key)
+        object.__setattr__(self, 'id', account_id)
+        object.__setattr__(self, '_signer',
+                           TwrSigner(c_key, c_secret, a_key, a_secret))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TwrAccount can not be modified')
+
+    def sign(self, method, url, request_params):
+        with span('oauth.sign'):
+            return self._signer.authorization_header(method, url,
+                                                     request_params)
+
+    def sign_many(self, requests):
+        return self._signer.authorization_headers(requests)
 
     @classmethod
-    def set_secrets(cls, c_key, c_secret, a_key, a_secret):
-        cls._consumer_key = c_key
-        cls._consumer_secret = c_secret
-        cls._access_key = a_key
-        cls._access_secret = a_secret
+    def get_default(cls):
+        return cls._default
 
     @classmethod
-    def _oauth_signature(cls, method, url, params):
-        recipe = (
-            method,
-            TwrAccount._percent(url),
-            TwrAccount._percent(TwrAccount._string_params(params)))
-
-        raw = '&'.join(recipe)
-        key = '%s&%s' % (TwrAccount._percent(cls._consumer_secret),
-                         TwrAccount._percent(cls._access_secret))
-
-        hashed = hmac.new(key, raw, hashlib.sha1)
-        signature = binascii.b2a_base64(hashed.digest())[:-1]
-
-        return signature
+    def set_secrets(cls, c_key, c_secret, a_key, a_secret):
+        cls._default = TwrAccount(c_key, c_secret, a_key, a_secret)
 
     @classmethod
     def authorization_header(cls, method, url, request_params):
-        oauth_params = {
-            'oauth_nonce': TwrAccount._nonce(),
-            'oauth_timestamp': TwrAccount._timestamp(),
-            'oauth_consumer_key': cls._consumer_key,
-            'oauth_version': '1.0',
-            'oauth_token': cls._access_key,
-            'oauth_signature_method': 'HMAC-SHA1'}
-
-        params = dict(oauth_params.items() + request_params)
-        params['oauth_signature'] = cls._oauth_signature(method, url, params)
-
-        header = 'OAuth %s' % ', '.join(['%s="%s"' % \
-                              (k, TwrAccount._percent(v)) \
-                              for k, v in sorted(params.iteritems())])
-
-        return header
-
-    @staticmethod
-    def _percent(string):
-        return urllib.quote(str(string), safe='~')
+        return cls._default.sign(method, url, request_params)
 
-    @staticmethod
-    def _utf8(string):
-        return str(string).encode("utf-8")
-
-    @staticmethod
-    def _nonce(length=8):
-        return ''.join([str(random.randint(0, 9)) for i in range(length)])
-
-    @staticmethod
-    def _timestamp():
-        return int(time.time())
-
-    @staticmethod
-    def _string_params(params):
-        key_values = [(TwrAccount._percent(TwrAccount._utf8(k)), \
-                       TwrAccount._percent(TwrAccount._utf8(v))) \
-                       for k, v in params.items()]
-        key_values.sort()
-
-        return '&'.join(['%s=%s' % (k, v) for k, v in key_values])
+    @classmethod
+    def authorization_headers(cls, requests):
+        return cls._default.sign_many(requests)
 
 
 class TwrStatusNotCreated(Exception):
@@ -128,10 +128,10 @@ class TwrSearchError(Exception):
 
 class TwrOauth(GObject.GObject):
 
-    REQUEST_TOKEN_URL = 'https://api.twitter.com/oauth/request_token'
-    AUTHORIZATION_URL = 'https://api.twitter.com/oauth/'\
+    REQUEST_TOKEN_URL = API_BASE + '/oauth/request_token'
+    AUTHORIZATION_URL = API_BASE + '/oauth/'\
                         'authorize?oauth_token=%s'
-    ACCESS_TOKEN_URL = 'https://api.twitter.com/oauth/access_token'
+    ACCESS_TOKEN_URL = API_BASE + '/oauth/access_token'
 
     __gsignals__ = {
         'request-downloaded':       (GObject.SignalFlags.RUN_FIRST,
@@ -143,6 +143,10 @@ class TwrOauth(GObject.GObject):
         'access-downloaded-failed': (GObject.SignalFlags.RUN_FIRST,
                                     None, ([str]))}
 
+    def __init__(self, account=None):
+        GObject.GObject.__init__(self)
+        self._account = account
+
     def request_token(self):
         GObject.idle_add(self._get,
                         self.REQUEST_TOKEN_URL,
@@ -168,7 +172,7 @@ class TwrOauth(GObject.GObject):
     def _get(self, url, params,
             completed_cb, failed_cb, completed_data, failed_data):
 
-        object = TwrObject()
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
         object.request('GET', url, params)
@@ -176,7 +180,7 @@ class TwrOauth(GObject.GObject):
     def _post(self, url, params, filepath,
             completed_cb, failed_cb, completed_data, failed_data):
 
-        object = TwrObject()
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
         object.request('POST', url, params, filepath)
@@ -203,11 +207,12 @@ class TwrObject(GObject.GObject):
         'transfer-progress': (GObject.SignalFlags.RUN_FIRST, None, \
                              ([float, float, str])),
         'transfer-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
-        'transfer-started': (GObject.SignalFlags.RUN_FIRST, None, ([]))}
+        'transfer-started': (GObject.SignalFlags.RUN_FIRST, None, ([])),
+        'transfer-stats': (GObject.SignalFlags.RUN_FIRST, None, ([object]))}
 
     def _gen_header(self, method, url, params=[]):
-        authorization = TwrAccount.authorization_header(method, url, params)
-        headers = ['Host: api.twitter.com',
+        authorization = self._signing_account().sign(method, url, params)
+        headers = ['Host: %s' % urlparse(url).netloc,
                    'Authorization: %s' % authorization]
 
         return headers
@@ -239,15 +244,84 @@ class TwrObject(GObject.GObject):
         if total == done and state in states and len(states) == state + 1:
             states.append(state + 1)
 
-    def request(self, method, url, params, filepath=None):
-        c = pycurl.Curl()
+    retry_policy = TwrRetryPolicy()
+
+    # identical GETs in flight, key -> objects waiting for the same bytes
+    _flights = {}
+
+    def __init__(self, account=None):
+        GObject.GObject.__init__(self)
+        self._account = account
+        self._attempt = 0
+        self._flight_key = None
+        self._cache_key = None
+        self._cache_entry = None
+        self._cache_ttl = None
+
+    def request(self, method, url, params, filepath=None, stream=None,
+                cache=True, cache_ttl=None):
+        # bytes from here on, for the cache key, the signature and the url
+        params = encode_params(params)
+
+        if method == 'GET' and stream is None:
+            # what one account may see is not what another may
+            key = '%s %s' % (self._signing_account().id,
+                             cache_key(method, url, params))
+
+            if cache:
+                self._cache_key = key
+                self._cache_entry = TwrCache.get_default().lookup(key)
+                self._cache_ttl = cache_ttl
+
+                entry = self._cache_entry
+                if entry is not None and \
+                   TwrCache.get_default().is_fresh(entry):
+                    self.emit('transfer-completed', entry['body'])
+                    return
+
+            if key in TwrObject._flights:
+                TwrObject._flights[key].append(self)
+                return
+
+            TwrObject._flights[key] = []
+            self._flight_key = key
+
+        self._schedule(method, url, params, filepath, stream)
+
+    def _schedule(self, method, url, params, filepath, stream):
+        # signed once the endpoint has budget left, not while it waits
+        self._limiter().schedule(url, self._perform, method,
+                                 url, params, filepath, stream)
+
+    def _signing_account(self):
+        if self._account is None:
+            return TwrAccount.get_default()
+        return self._account
+
+    def _limiter(self):
+        # budgets belong to an access token, not to the process
+        if self._account is None:
+            return TwrRateLimiter.get_default()
+        return TwrRateLimiter.get_for(self._account.id)
+
+    def _perform(self, method, url, params, filepath, stream):
+        c = TwrPool.get_default().acquire(url)
+        endpoint = url
+        request_params = params
+
+        transfer = span('http.transfer', method=method,
+                        endpoint=endpoint_family(url), attempt=self._attempt)
+
+        validators = []
+        if self._cache_entry is not None:
+            validators = TwrCache.get_default().validators(self._cache_entry)
 
         if method == 'POST':
             c.setopt(c.POST, 1)
             c.setopt(c.HTTPHEADER, self._gen_header(method, url))
 
             if filepath is not None:
-                params += [("media", (c.FORM_FILE, filepath))]
+                params = params + [("media", (c.FORM_FILE, filepath))]
 
             if params is not None:
                 c.setopt(c.HTTPPOST, params)
@@ -255,7 +329,8 @@ class TwrObject(GObject.GObject):
                 c.setopt(c.POSTFIELDS, '')
         else:
             c.setopt(c.HTTPGET, 1)
-            c.setopt(c.HTTPHEADER, self._gen_header(method, url, params))
+            c.setopt(c.HTTPHEADER,
+                     self._gen_header(method, url, params) + validators)
             url += '?%s' % urllib.urlencode(params)
 
         # XXX hack to trace transfer states
@@ -268,39 +343,179 @@ class TwrObject(GObject.GObject):
         #XXX hack to write multiple responses
         buffer = []
 
+        # error bodies are never streamed, so a failed attempt
+        # can be retried as long as no tweet was handed out
+        streamed = []
+
         def __write_cb(data):
-            buffer.append(data)
+            if stream is None or status != [200]:
+                buffer.append(data)
+                return
+
+            streamed.append(True)
+            try:
+                stream.feed(data)
+            except ValueError, e:
+                print 'TwrObject.__write_cb crashed with %s' % str(e)
+                # aborts the transfer
+                return 0
+
+        headers = {}
+        status = []
+
+        def __header_cb(line):
+            if line.startswith('HTTP/'):
+                headers.clear()
+                del status[:]
+                status.append(int(line.split()[1]))
+            elif ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        def __done_cb(c, error):
+            transfer.end()
+
+            code = None
+            if error is None:
+                code = c.getinfo(c.HTTP_CODE)
+                self._limiter().update(endpoint, code, headers)
+                code = self._cache_response(code, headers, buffer)
+
+            self._transfer_stats(c, method, endpoint, error)
+
+            failed = error is not None or not 200 <= code < 300
+            if failed and not streamed:
+                delay = self.retry_policy.retry_delay(method, endpoint,
+                                                      self._attempt,
+                                                      error, code)
+                if delay is not None:
+                    TwrPool.get_default().release(c)
+                    self._attempt += 1
+                    GObject.timeout_add(int(delay * 1000), self._schedule,
+                                        method, endpoint, request_params,
+                                        filepath, stream)
+                    return
+
+            # everyone who asked for the same bytes gets its own signals
+            objects = [self] + self._land()
+
+            try:
+                for object in objects:
+                    if error is not None:
+                        object.emit('transfer-failed', str(error))
+                    elif failed:
+                        object.emit('transfer-failed', 'HTTP code %s' % code)
+            finally:
+                if stream is None:
+                    data = ''.join(buffer)
+                else:
+                    data = self._stream_remains(stream)
+                for object in objects:
+                    object.emit('transfer-completed', data)
+                TwrPool.get_default().release(c)
 
         c.setopt(c.URL, url)
         c.setopt(c.NOPROGRESS, 0)
         c.setopt(c.PROGRESSFUNCTION, pre_update_cb)
         c.setopt(c.WRITEFUNCTION, __write_cb)
+        c.setopt(c.HEADERFUNCTION, __header_cb)
         #c.setopt(c.VERBOSE, True)
 
+        # transfers run concurrently on the main loop, see TwrMulti
+        TwrMulti.get_default().add(c, __done_cb)
+
+    def _transfer_stats(self, c, method, url, error):
+        # one per attempt, retries included
+        stats = {'method': method,
+                 'endpoint': endpoint_family(url),
+                 'code': c.getinfo(c.HTTP_CODE),
+                 'error': None,
+                 'namelookup': c.getinfo(c.NAMELOOKUP_TIME),
+                 'connect': c.getinfo(c.CONNECT_TIME),
+                 'appconnect': c.getinfo(c.APPCONNECT_TIME),
+                 'starttransfer': c.getinfo(c.STARTTRANSFER_TIME),
+                 'total': c.getinfo(c.TOTAL_TIME),
+                 'size_download': c.getinfo(c.SIZE_DOWNLOAD),
+                 'size_upload': c.getinfo(c.SIZE_UPLOAD),
+                 'retries': self._attempt}
+        if error is not None:
+            stats['error'] = str(error)
+
+        TwrStats.get_default().record(stats)
+        self.emit('transfer-stats', stats)
+
+    def _land(self):
+        if self._flight_key is None:
+            return []
+
+        followers = TwrObject._flights.pop(self._flight_key, [])
+        self._flight_key = None
+        return followers
+
+    def _cache_response(self, code, headers, buffer):
+        if self._cache_key is None:
+            return code
+
+        cache = TwrCache.get_default()
+        if code == 304 and self._cache_entry is not None:
+            cache.revalidated(self._cache_key, self._cache_entry, headers,
+                              self._cache_ttl)
+            buffer[:] = [self._cache_entry['body']]
+            return 200
+
+        if code == 200:
+            cache.store(self._cache_key, headers, ''.join(buffer),
+                        self._cache_ttl)
+        return code
+
+    def _stream_remains(self, stream):
+        # what is left once the streamed objects are taken out, ie. [],
+        # search_metadata or the errors, goes through transfer-completed
         try:
-            c.perform()
-        except pycurl.error, e:
-            self.emit('transfer-failed', str(e))
-        else:
-            code = c.getinfo(c.HTTP_CODE)
-            if code != 200:
-                self.emit('transfer-failed', 'HTTP code %s' % code)
-        finally:
-            self.emit('transfer-completed', ''.join(buffer))
-            c.close()
+            return json.dumps(stream.close())
+        except ValueError, e:
+            print 'TwrObject._stream_remains crashed with %s' % str(e)
+            return ''
 
 
 class TwrSearch(GObject.GObject):
 
-    TWEETS_URL = 'https://api.twitter.com/1.1/search/tweets.json'
+    TWEETS_URL = API_BASE + '/1.1/search/tweets.json'
+
+    # seconds after a network search the same query is only answered
+    # from the store
+    LOCAL_FRESHNESS = 60
+    LOCAL_COUNT = 100
+
+    # query -> last time it went to the network
+    _searched = {}
 
     __gsignals__ = {
         'tweets-downloaded':        (GObject.SignalFlags.RUN_FIRST,
                                     None, ([object])),
         'tweets-downloaded-failed': (GObject.SignalFlags.RUN_FIRST,
-                                    None, ([str]))}
+                                    None, ([str])),
+        'tweet-received':           (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([object]))}
+
+    def __init__(self, streaming=False, projection=None, store=None,
+                 account=None):
+        GObject.GObject.__init__(self)
+        self._account = account
+        self._streaming = streaming
+        # statuses come out as TwrTweet when there is a projection
+        self._projection = projection
+        # with a TwrStore, queries are answered from its index first
+        self._store = store
+        # transfers whose failure was already reported
+        self._failed = set()
 
     def tweets(self, q, count=None, since_id=None, max_id=None):
+        # older pages are not in the index, those always go remote
+        if self._store is not None and max_id is None:
+            GObject.idle_add(self._local_tweets, q, count, since_id)
+            return
+
         params = [('q', (q))]
 
         if count is not None:
@@ -321,34 +536,147 @@ class TwrSearch(GObject.GObject):
     def _get(self, url, params, completed_cb, failed_cb,
             completed_data, failed_data):
 
-        object = TwrObject()
+        stream = None
+        if self._streaming:
+            stream = TwrJsonStream(self.__tweet_cb, 'statuses')
+
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
-        object.request('GET', url, params)
+        object.request('GET', url, params, stream=stream)
+
+    def __tweet_cb(self, tweet):
+        if self._projection is not None:
+            tweet = self._projection.tweet(tweet)
+        self.emit('tweet-received', tweet)
+
+    def _local_tweets(self, q, count, since_id):
+        local = self._store.search(q, count or self.LOCAL_COUNT)
+        if since_id is not None:
+            local = [tweet for tweet in local
+                     if int(tweet['id_str']) > int(since_id)]
+
+        if time.time() - TwrSearch._searched.get(q, 0) < self.LOCAL_FRESHNESS:
+            self._emit_local(q, local, [], count)
+            return False
+
+        # only what is newer than the last time this query went out
+        newest_id = self._store.get_watermark('search:%s' % q)
+        if since_id is not None and \
+           (newest_id is None or int(since_id) > int(newest_id)):
+            newest_id = since_id
+
+        params = [('q', (q))]
+        if count is not None:
+            params += [('count', (count))]
+        if newest_id is not None:
+            params += [('since_id', (newest_id))]
+
+        object = TwrObject(self._account)
+        object.connect('transfer-completed', self.__local_completed_cb,
+                       q, local, count)
+        object.connect('transfer-failed', self.__local_transfer_failed_cb,
+                       q, local, count)
+        object.request('GET', self.TWEETS_URL, params)
+
+        return False
+
+    def __local_completed_cb(self, object, data, q, local, count):
+        if object in self._failed:
+            self._failed.discard(object)
+            return
+
+        try:
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
+
+            if isinstance(info, dict) and ('errors' in info.keys()):
+                raise TwrSearchError(str(info['errors']))
+
+            remote = info['statuses']
+            self._store.add(remote)
+            if remote:
+                newest_id = max([int(tweet['id_str']) for tweet in remote])
+                self._store.set_watermark('search:%s' % q, str(newest_id))
+            TwrSearch._searched[q] = time.time()
+
+            self._emit_local(q, local, remote, count,
+                             info.get('search_metadata'))
+        except Exception, e:
+            print 'TwrSearch.__local_completed_cb crashed with %s' % str(e)
+            self.__local_failed_cb(object, str(e), q, local, count)
+
+    def __local_transfer_failed_cb(self, object, message, q, local, count):
+        self._failed.add(object)
+        self.__local_failed_cb(object, message, q, local, count)
+
+    def __local_failed_cb(self, object, message, q, local, count):
+        # offline, what is in the store is still an answer
+        if not local:
+            self.emit('tweets-downloaded-failed', message)
+            return
+
+        self._emit_local(q, local, [], count)
+
+    def _emit_local(self, q, local, remote, count, metadata=None):
+        seen = set([tweet['id_str'] for tweet in remote])
+        statuses = remote + [tweet for tweet in local
+                             if tweet['id_str'] not in seen]
+        if count is not None:
+            statuses = statuses[:int(count)]
+
+        if metadata is None:
+            metadata = {'query': q}
+
+        info = {'statuses': statuses, 'search_metadata': metadata}
+        if self._projection is not None:
+            info = self._projection.decode(info)
+
+        self.emit('tweets-downloaded', info)
 
     def __completed_cb(self, object, data, signal):
+        if object in self._failed:
+            self._failed.discard(object)
+            return
+
         try:
-            info = json.loads(data)
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
 
             if isinstance(info, dict) and ('errors' in info.keys()):
                 raise TwrSearchError(str(info['errors']))
 
+            if self._projection is not None:
+                info = self._projection.decode(info)
+
             self.emit(signal, info)
         except Exception, e:
             print 'TwrSearch.__completed_cb crashed with %s' % str(e)
+            # whoever waits for this answer needs one either way
+            self.emit('%s-failed' % signal, str(e))
 
     def __failed_cb(self, object, message, signal):
+        self._failed.add(object)
         self.emit(signal, message)
 
 
 class TwrStatus(GObject.GObject):
-    UPDATE_URL = 'https://api.twitter.com/1.1/statuses/update.json'
-    UPDATE_WITH_MEDIA_URL = 'https://api.twitter.com/1.1/statuses/'\
+    UPDATE_URL = API_BASE + '/1.1/statuses/update.json'
+    UPDATE_WITH_MEDIA_URL = API_BASE + '/1.1/statuses/'\
                             'update_with_media.json'
-    SHOW_URL = 'https://api.twitter.com/1.1/statuses/show.json'
-    RETWEET_URL = 'https://api.twitter.com/1.1/statuses/retweet/%s.json'
-    RETWEETS_URL = 'https://api.twitter.com/1.1/statuses/retweets/%s.json'
-    DESTROY_URL = 'https://api.twitter.com/1.1/statuses/destroy/%s.json'
+    SHOW_URL = API_BASE + '/1.1/statuses/show.json'
+    LOOKUP_URL = API_BASE + '/1.1/statuses/lookup.json'
+    RETWEET_URL = API_BASE + '/1.1/statuses/retweet/%s.json'
+    RETWEETS_URL = API_BASE + '/1.1/statuses/retweets/%s.json'
+    DESTROY_URL = API_BASE + '/1.1/statuses/destroy/%s.json'
+
+    # seconds a response stays fresh, per signal
+    CACHE_TTL = {'status-downloaded': 60,
+                 'retweets-downloaded': 60}
+
+    # ids per statuses/lookup call and milliseconds to gather them
+    LOOKUP_SIZE = 100
+    LOOKUP_WINDOW = 50
 
     __gsignals__ = {
         'status-updated':             (GObject.SignalFlags.RUN_FIRST,
@@ -370,11 +698,14 @@ class TwrStatus(GObject.GObject):
         'retweets-downloaded':        (GObject.SignalFlags.RUN_FIRST,
                                       None, ([object])),
         'retweets-downloaded-failed': (GObject.SignalFlags.RUN_FIRST,
-                                      None, ([str]))}
+                                      None, ([str])),
+        'transfer-progress':          (GObject.SignalFlags.RUN_FIRST,
+                                      None, ([float, float, str]))}
 
-    def __init__(self, status_id=None):
+    def __init__(self, status_id=None, account=None):
         GObject.GObject.__init__(self)
         self._status_id = status_id
+        self._account = account
 
     def update(self, status, reply_status_id=None):
         self._update(self.UPDATE_URL,
@@ -382,18 +713,49 @@ class TwrStatus(GObject.GObject):
                     None,
                     reply_status_id)
 
-    def update_with_media(self, status, filepath, reply_status_id=None):
-        self._update(self.UPDATE_WITH_MEDIA_URL,
+    def update_with_media(self, status, filepath=None, reply_status_id=None,
+                          chunked=False, buffer=None):
+        if not chunked:
+            self._update(self.UPDATE_WITH_MEDIA_URL,
+                        status,
+                        filepath,
+                        reply_status_id,
+                        buffer=buffer)
+            return
+
+        self._check_is_not_created()
+
+        media = TwrMedia(filepath, buffer=buffer, account=self._account)
+        media.connect('media-uploaded', self.__media_uploaded_cb,
+                      status, reply_status_id)
+        media.connect('media-uploaded-failed', self.__failed_cb,
+                      'status-updated-failed')
+        media.connect('transfer-progress', self.__media_progress_cb)
+        media.upload()
+
+    def __media_uploaded_cb(self, media, info, status, reply_status_id):
+        self._update(self.UPDATE_URL,
                     status,
-                    filepath,
-                    reply_status_id)
+                    None,
+                    reply_status_id,
+                    info['media_id_string'])
 
-    def _update(self, url, status, filepath=None, reply_status_id=None):
+    def __media_progress_cb(self, media, total, done, mode):
+        self.emit('transfer-progress', total, done, mode)
+
+    def _update(self, url, status, filepath=None, reply_status_id=None,
+                media_ids=None, buffer=None):
         self._check_is_not_created()
 
         params = [('status', (status))]
         if reply_status_id is not None:
             params += [('in_reply_to_status_id', (reply_status_id))]
+        if media_ids is not None:
+            params += [('media_ids', (media_ids))]
+        if buffer is not None:
+            pycurl = get_pycurl()
+            params += [('media', (pycurl.FORM_BUFFER, 'media',
+                                  pycurl.FORM_BUFFERPTR, buffer))]
 
         GObject.idle_add(self._post,
                         url,
@@ -404,8 +766,16 @@ class TwrStatus(GObject.GObject):
                         'status-updated',
                         'status-updated-failed')
 
-    def show(self):
+    _lookups = {}
+    _lookup_id = None
+
+    def show(self, batched=False):
         self._check_is_created()
+
+        if batched:
+            TwrStatus._queue_lookups([self])
+            return
+
         GObject.idle_add(self._get,
                         self.SHOW_URL,
                         [('id', (self._status_id))],
@@ -446,6 +816,94 @@ class TwrStatus(GObject.GObject):
                         'retweets-downloaded',
                         'retweets-downloaded-failed')
 
+    @classmethod
+    def show_many(cls, statuses):
+        if not statuses:
+            return
+
+        for status in statuses:
+            status._check_is_created()
+
+        cls._queue_lookups(statuses)
+        # no need to wait for more ids
+        if cls._lookup_id is not None:
+            GObject.source_remove(cls._lookup_id)
+        cls._lookup_id = GObject.idle_add(cls._flush_lookups)
+
+    @classmethod
+    def _queue_lookups(cls, statuses):
+        # one batch per account, ids only mean something to their own
+        for status in statuses:
+            lookups = cls._lookups.setdefault(status._account, {})
+            # answers come keyed by id_str
+            lookups.setdefault(str(status._status_id), []).append(status)
+
+        if cls._lookup_id is None:
+            cls._lookup_id = GObject.timeout_add(cls.LOOKUP_WINDOW,
+                                                 cls._flush_lookups)
+
+    @classmethod
+    def _flush_lookups(cls):
+        accounts = cls._lookups
+        cls._lookups = {}
+        cls._lookup_id = None
+
+        for account, lookups in accounts.items():
+            cls._lookup(account, lookups)
+
+        return False
+
+    @classmethod
+    def _lookup(cls, account, lookups):
+        status_ids = sorted(lookups.keys())
+        for i in range(0, len(status_ids), cls.LOOKUP_SIZE):
+            chunk = dict([(status_id, lookups[status_id])
+                          for status_id in status_ids[i:i + cls.LOOKUP_SIZE]])
+            params = [('id', ','.join(status_ids[i:i + cls.LOOKUP_SIZE]))]
+            cache_ttl = cls.CACHE_TTL.get('status-downloaded')
+
+            object = TwrObject(account)
+            object.connect('transfer-completed', cls._lookup_completed_cb,
+                           chunk)
+            object.connect('transfer-failed', cls._lookup_failed_cb, chunk)
+            object.request('GET', cls.LOOKUP_URL, params,
+                           cache=cache_ttl != 0, cache_ttl=cache_ttl)
+
+        return False
+
+    @classmethod
+    def _lookup_completed_cb(cls, object, data, chunk):
+        if not chunk:
+            return
+
+        try:
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
+
+            if isinstance(info, dict) and ('errors' in info.keys()):
+                raise TwrStatusError(str(info['errors']))
+
+            for status_info in info:
+                statuses = chunk.pop(status_info['id_str'], [])
+                for status in statuses:
+                    status.emit('status-downloaded', status_info)
+        except Exception, e:
+            print 'TwrStatus._lookup_completed_cb crashed with %s' % str(e)
+
+        # lookup leaves out deleted and protected statuses
+        for status_id, statuses in chunk.items():
+            for status in statuses:
+                status.emit('status-downloaded-failed',
+                            'Status %s not found' % status_id)
+        chunk.clear()
+
+    @classmethod
+    def _lookup_failed_cb(cls, object, message, chunk):
+        for statuses in chunk.values():
+            for status in statuses:
+                status.emit('status-downloaded-failed', message)
+        chunk.clear()
+
     def _check_is_not_created(self):
         if self._status_id is not None:
             raise TwrStatusAlreadyCreated('Status already created')
@@ -457,22 +915,27 @@ class TwrStatus(GObject.GObject):
     def _get(self, url, params,
             completed_cb, failed_cb, completed_data, failed_data):
 
-        object = TwrObject()
+        # 0 keeps a signal out of the cache, no entry follows the server
+        cache_ttl = self.CACHE_TTL.get(completed_data)
+
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
-        object.request('GET', url, params)
+        object.request('GET', url, params, cache=cache_ttl != 0,
+                       cache_ttl=cache_ttl)
 
     def _post(self, url, params, filepath,
             completed_cb, failed_cb, completed_data, failed_data):
 
-        object = TwrObject()
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
         object.request('POST', url, params, filepath)
 
     def __completed_cb(self, object, data, signal):
         try:
-            info = json.loads(data)
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
 
             if 'errors' in info.keys():
                 raise TwrStatusError(str(info['errors']))
@@ -490,9 +953,9 @@ class TwrStatus(GObject.GObject):
 
 class TwrTimeline(TwrObject):
 
-    MENTIONS_TIMELINE_URL = 'https://api.twitter.com/1.1/statuses/'\
+    MENTIONS_TIMELINE_URL = API_BASE + '/1.1/statuses/'\
                             'mentions_timeline.json'
-    HOME_TIMELINE_URL = 'https://api.twitter.com/1.1/statuses/'\
+    HOME_TIMELINE_URL = API_BASE + '/1.1/statuses/'\
                         'home_timeline.json'
 
     __gsignals__ = {
@@ -503,7 +966,17 @@ class TwrTimeline(TwrObject):
         'timeline-downloaded':          (GObject.SignalFlags.RUN_FIRST,
                                         None, ([object])),
         'timeline-downloaded-failed':   (GObject.SignalFlags.RUN_FIRST,
-                                        None, ([str]))}
+                                        None, ([str])),
+        'tweet-received':               (GObject.SignalFlags.RUN_FIRST,
+                                        None, ([object]))}
+
+    def __init__(self, streaming=False, projection=None, account=None):
+        TwrObject.__init__(self, account)
+        self._streaming = streaming
+        # statuses come out as TwrTweet when there is a projection
+        self._projection = projection
+        # transfers whose failure was already reported
+        self._failed = set()
 
     def mentions_timeline(self, count=None, since_id=None, max_id=None):
         params = self._params(count, since_id, max_id)
@@ -546,21 +1019,229 @@ class TwrTimeline(TwrObject):
     def _get(self, url, params, completed_cb, failed_cb,
             completed_data, failed_data):
 
-        object = TwrObject()
+        stream = None
+        if self._streaming:
+            stream = TwrJsonStream(self.__tweet_cb)
+
+        object = TwrObject(self._account)
         object.connect('transfer-completed', completed_cb, completed_data)
         object.connect('transfer-failed', failed_cb, failed_data)
-        object.request('GET', url, params)
+        object.request('GET', url, params, stream=stream)
+
+    def __tweet_cb(self, tweet):
+        if self._projection is not None:
+            tweet = self._projection.tweet(tweet)
+        self.emit('tweet-received', tweet)
 
     def __completed_cb(self, object, data, signal):
+        if object in self._failed:
+            self._failed.discard(object)
+            return
+
         try:
-            info = json.loads(data)
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
 
             if isinstance(info, dict) and ('errors' in info.keys()):
                 raise TwrTimelineError(str(info['errors']))
 
+            if self._projection is not None:
+                info = self._projection.decode(info)
+
             self.emit(signal, info)
         except Exception, e:
             print 'TwrTimeline.__completed_cb crashed with %s' % str(e)
+            # whoever waits for this answer needs one either way
+            self.emit('%s-failed' % signal, str(e))
 
     def __failed_cb(self, object, message, signal):
+        self._failed.add(object)
         self.emit(signal, message)
+
+
+class TwrMedia(GObject.GObject):
+
+    UPLOAD_URL = UPLOAD_BASE + '/1.1/media/upload.json'
+
+    SEGMENT_SIZE = 1024 * 1024
+
+    __gsignals__ = {
+        'media-uploaded':           (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([object])),
+        'media-uploaded-failed':    (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([str])),
+        'transfer-progress':        (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([float, float, str]))}
+
+    def __init__(self, filepath=None, media_type=None, checkpoint_path=None,
+                 buffer=None, account=None):
+        GObject.GObject.__init__(self)
+        self._account = account
+
+        if media_type is None and filepath is not None:
+            media_type = mimetypes.guess_type(filepath)[0]
+        if media_type is None:
+            media_type = 'image/png'
+        if checkpoint_path is None and filepath is not None:
+            checkpoint_path = '%s.upload' % filepath
+
+        # segments come from the buffer when there is one, the file only
+        # tells whether a checkpoint still matches
+        self._filepath = filepath
+        self._buffer = buffer
+        self._media_type = media_type
+        self._checkpoint_path = checkpoint_path
+        self._checkpoint = None
+        self._failed = False
+
+    def upload(self):
+        size, mtime = self._identity()
+
+        # resume from the last segment the server acknowledged
+        checkpoint = self._load_checkpoint()
+        if checkpoint is not None and \
+           checkpoint['size'] == size and \
+           checkpoint['mtime'] == mtime and \
+           checkpoint['expires'] > time.time():
+            self._checkpoint = checkpoint
+            GObject.idle_add(self._append)
+            return
+
+        self._checkpoint = {'size': size,
+                            'mtime': mtime,
+                            'media_id': None,
+                            'expires': None,
+                            'segments': 0}
+
+        params = [('command', 'INIT'),
+                  ('total_bytes', str(size)),
+                  ('media_type', self._media_type)]
+
+        GObject.idle_add(self._post, params, self.__init_cb)
+
+    def _append(self):
+        checkpoint = self._checkpoint
+        offset = checkpoint['segments'] * self.SEGMENT_SIZE
+
+        if offset >= checkpoint['size']:
+            params = [('command', 'FINALIZE'),
+                      ('media_id', checkpoint['media_id'])]
+            self._post(params, self.__finalize_cb)
+            return
+
+        if self._buffer is not None:
+            segment = self._buffer[offset:offset + self.SEGMENT_SIZE]
+        else:
+            media = open(self._filepath, 'rb')
+            try:
+                media.seek(offset)
+                segment = media.read(self.SEGMENT_SIZE)
+            finally:
+                media.close()
+
+        pycurl = get_pycurl()
+        params = [('command', 'APPEND'),
+                  ('media_id', checkpoint['media_id']),
+                  ('segment_index', str(checkpoint['segments'])),
+                  ('media', (pycurl.FORM_BUFFER, 'media',
+                             pycurl.FORM_BUFFERPTR, segment))]
+        self._post(params, self.__append_cb)
+
+    def _post(self, params, completed_cb):
+        self._failed = False
+
+        object = TwrObject(self._account)
+        object.connect('transfer-completed', completed_cb)
+        object.connect('transfer-failed', self.__failed_cb)
+        object.request('POST', self.UPLOAD_URL, params)
+
+    def __init_cb(self, object, data):
+        if self._failed:
+            return
+
+        try:
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
+            if 'errors' in info.keys():
+                raise TwrStatusError(str(info['errors']))
+
+            self._checkpoint['media_id'] = info['media_id_string']
+            self._checkpoint['expires'] = \
+                time.time() + int(info.get('expires_after_secs', 0))
+        except Exception, e:
+            print 'TwrMedia.__init_cb crashed with %s' % str(e)
+            self.emit('media-uploaded-failed', str(e))
+            return
+
+        self._append()
+
+    def __append_cb(self, object, data):
+        if self._failed:
+            return
+
+        self._checkpoint['segments'] += 1
+        self._save_checkpoint()
+
+        done = min(self._checkpoint['segments'] * self.SEGMENT_SIZE,
+                   self._checkpoint['size'])
+        self.emit('transfer-progress', self._checkpoint['size'], done,
+                  'upload')
+
+        self._append()
+
+    def __finalize_cb(self, object, data):
+        if self._failed:
+            return
+
+        try:
+            with span('json.decode', size=len(data)):
+                info = json.loads(data)
+            if 'errors' in info.keys():
+                raise TwrStatusError(str(info['errors']))
+        except Exception, e:
+            print 'TwrMedia.__finalize_cb crashed with %s' % str(e)
+            self.emit('media-uploaded-failed', str(e))
+            return
+
+        self._remove_checkpoint()
+        self.emit('media-uploaded', info)
+
+    def __failed_cb(self, object, message):
+        # the checkpoint stays, the next upload() resumes from it
+        self._failed = True
+        self.emit('media-uploaded-failed', message)
+
+    def _identity(self):
+        if self._buffer is None:
+            stat = os.stat(self._filepath)
+            return stat.st_size, int(stat.st_mtime)
+
+        mtime = 0
+        if self._filepath is not None and os.path.exists(self._filepath):
+            mtime = int(os.stat(self._filepath).st_mtime)
+        return len(self._buffer), mtime
+
+    def _load_checkpoint(self):
+        if self._checkpoint_path is None:
+            return None
+        try:
+            with open(self._checkpoint_path) as checkpoint:
+                return json.load(checkpoint)
+        except (IOError, ValueError):
+            return None
+
+    def _save_checkpoint(self):
+        if self._checkpoint_path is None:
+            return
+        path = '%s.tmp' % self._checkpoint_path
+        try:
+            with open(path, 'w') as checkpoint:
+                json.dump(self._checkpoint, checkpoint)
+            os.rename(path, self._checkpoint_path)
+        except (IOError, OSError), e:
+            print 'TwrMedia._save_checkpoint crashed with %s' % str(e)
+
+    def _remove_checkpoint(self):
+        if self._checkpoint_path is not None and \
+           os.path.exists(self._checkpoint_path):
+            os.unlink(self._checkpoint_path)
@@ -0,0 +1,245 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import json
+import time
+import urllib
+import hashlib
+
+from collections import OrderedDict
+
+
+def cache_key(method, url, params):
+    return '%s %s?%s' % (method, url, urllib.urlencode(sorted(params)))
+
+
+def _cache_control(headers):
+    directives = {}
+
+    for directive in headers.get('cache-control', '').split(','):
+        name, sep, value = directive.strip().lower().partition('=')
+        if name:
+            directives[name] = value.strip('"')
+
+    return directives
+
+
+class TwrCache:
+    """ GET responses kept in memory and, optionally, on disk.
+
+    Entries live for the Cache-Control max-age the server sends, or for
+    the ttl the caller asks for, which also overrides no-store for
+    endpoints known to be safe to keep, ie. a status. Stale entries with
+    an ETag or Last-Modified are revalidated instead of fetched again.
+    """
+
+    MAX_ENTRIES = 256
+    MAX_BYTES = 4 * 1024 * 1024
+    # stale entries are only useful while they can be revalidated
+    MAX_AGE = 24 * 60 * 60
+    SWEEP_EVERY = 64
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrCache()
+        return cls._default
+
+    @classmethod
+    def set_default(cls, cache):
+        cls._default = cache
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES,
+                 max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self._path = path
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+
+        self._memory = OrderedDict()
+        self._size = 0
+        self._saves = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+        if path is not None:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            self._sweep_disk()
+
+    def lookup(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry['body'])
+        else:
+            entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry['stored'] + self._max_age < time.time() or \
+           (not self.is_fresh(entry) and not self.validators(entry)):
+            self._forget(key)
+            self.misses += 1
+            return None
+
+        # most recently used go last
+        self._memory[key] = entry
+        self._size += len(entry['body'])
+        self._evict_memory()
+
+        if self.is_fresh(entry):
+            self.hits += 1
+        return entry
+
+    def is_fresh(self, entry):
+        return entry['expires'] > time.time()
+
+    def validators(self, entry):
+        headers = []
+        if entry['etag'] is not None:
+            headers.append('If-None-Match: %s' % entry['etag'])
+        if entry['last_modified'] is not None:
+            headers.append('If-Modified-Since: %s' % entry['last_modified'])
+        return headers
+
+    def store(self, key, headers, body, ttl=None):
+        directives = _cache_control(headers)
+
+        if ttl is None:
+            if 'no-store' in directives:
+                return
+            try:
+                ttl = int(directives.get('max-age', 0))
+            except ValueError:
+                ttl = 0
+            if 'no-cache' in directives:
+                ttl = 0
+
+        entry = {'body': body,
+                 'etag': headers.get('etag'),
+                 'last_modified': headers.get('last-modified'),
+                 'stored': time.time(),
+                 'expires': time.time() + ttl}
+
+        if ttl <= 0 and entry['etag'] is None and \
+           entry['last_modified'] is None:
+            return
+
+        if len(body) > self._max_bytes:
+            return
+
+        self._forget(key)
+        self._memory[key] = entry
+        self._size += len(body)
+        self._evict_memory()
+        self._save(key, entry)
+
+    def revalidated(self, key, entry, headers, ttl=None):
+        self.revalidations += 1
+
+        if ttl is None:
+            try:
+                ttl = int(_cache_control(headers).get('max-age', 0))
+            except ValueError:
+                ttl = 0
+
+        entry['stored'] = time.time()
+        entry['expires'] = time.time() + ttl
+        self._save(key, entry)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'entries': len(self._memory),
+                'bytes': self._size}
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry['body'])
+
+        if self._path is not None and os.path.exists(self._filename(key)):
+            os.unlink(self._filename(key))
+
+    def _evict_memory(self):
+        while len(self._memory) > self._max_entries or \
+              self._size > self._max_bytes:
+            key, entry = self._memory.popitem(last=False)
+            self._size -= len(entry['body'])
+            self.evictions += 1
+
+    def _filename(self, key):
+        return os.path.join(self._path, hashlib.sha1(key).hexdigest())
+
+    def _load(self, key):
+        if self._path is None:
+            return None
+
+        try:
+            with open(self._filename(key)) as cached:
+                entry = json.load(cached)
+        except (IOError, ValueError):
+            return None
+
+        if entry.pop('key', None) != key:
+            return None
+
+        entry['body'] = entry['body'].encode('utf-8')
+        return entry
+
+    def _save(self, key, entry):
+        if self._path is None:
+            return
+
+        path = self._filename(key)
+        try:
+            with open('%s.tmp' % path, 'w') as cached:
+                json.dump(dict(entry, key=key), cached)
+            os.rename('%s.tmp' % path, path)
+        except (IOError, OSError, ValueError), e:
+            print 'TwrCache._save crashed with %s' % str(e)
+            return
+
+        self._saves += 1
+        if self._saves % self.SWEEP_EVERY == 0:
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        files = []
+        for name in os.listdir(self._path):
+            path = os.path.join(self._path, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort(reverse=True)
+        deadline = time.time() - self._max_age
+        size = 0
+
+        for mtime, file_size, path in files:
+            size += file_size
+            if mtime < deadline or size > self._max_bytes:
+                os.unlink(path)
+                self.evictions += 1
@@ -0,0 +1,108 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+from gi.repository import GConf
+from gi.repository import GObject
+
+from twitter import TwrAccount
+
+
+class TwrCredentials(GObject.GObject):
+    """ The Twitter tokens, read from GConf once and kept fresh.
+
+    Changes to the keys, from this process or any other, are picked up
+    through a GConf directory notification and pushed into
+    TwrAccount.set_secrets, so nothing needs to read them again.
+    """
+
+    DIR = '/desktop/sugar/collaboration'
+    CONSUMER_TOKEN_KEY = DIR + '/twitter_consumer_token'
+    CONSUMER_SECRET_KEY = DIR + '/twitter_consumer_secret'
+    ACCESS_TOKEN_KEY = DIR + '/twitter_access_token'
+    ACCESS_SECRET_KEY = DIR + '/twitter_access_secret'
+
+    KEYS = (CONSUMER_TOKEN_KEY, CONSUMER_SECRET_KEY,
+            ACCESS_TOKEN_KEY, ACCESS_SECRET_KEY)
+
+    __gsignals__ = {
+        'changed':  (GObject.SignalFlags.RUN_FIRST, None, ([]))}
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrCredentials()
+        return cls._default
+
+    def __init__(self, client=None):
+        GObject.GObject.__init__(self)
+
+        if client is None:
+            client = GConf.Client.get_default()
+
+        self._client = client
+        self._tokens = None
+        self._notify_id = None
+
+    def get_tokens(self):
+        """ (consumer token, consumer secret, access token, access secret)
+        """
+        if self._tokens is None:
+            self._load()
+        return tuple(self._tokens)
+
+    def is_configured(self):
+        return None not in self.get_tokens()
+
+    def set_tokens(self, c_key, c_secret, a_key, a_secret):
+        tokens = [c_key, c_secret, a_key, a_secret]
+        for key, value in zip(self.KEYS, tokens):
+            self._client.set_string(key, value)
+
+        # the notifications only say the same thing, later
+        self._tokens = tokens
+        self._push()
+
+    def _load(self):
+        if self._notify_id is None:
+            self._client.add_dir(self.DIR,
+                                 GConf.ClientPreloadType.PRELOAD_NONE)
+            self._notify_id = self._client.notify_add(self.DIR,
+                                                      self.__changed_cb,
+                                                      None)
+
+        self._tokens = [self._client.get_string(key) for key in self.KEYS]
+        self._push()
+
+    def _push(self):
+        TwrAccount.set_secrets(*self._tokens)
+        self.emit('changed')
+
+    def __changed_cb(self, client, cnxn_id, entry, user_data):
+        key = entry.get_key()
+        if key not in self.KEYS or self._tokens is None:
+            return
+
+        value = entry.get_value()
+        if value is not None:
+            value = value.get_string()
+
+        index = self.KEYS.index(key)
+        if self._tokens[index] != value:
+            self._tokens[index] = value
+            self._push()
@@ -0,0 +1,133 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import json
+import weakref
+
+
+class TwrUser(object):
+
+    FIELDS = ('id_str', 'name', 'screen_name', 'profile_image_url_https',
+              'followers_count')
+
+    __slots__ = FIELDS + ('__weakref__',)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class TwrTweet(object):
+    """ The fields of a status a consumer asked for, nothing more.
+
+    Reads like the dict it came from, ie. tweet['user']['name'], so code
+    written against the JSON keeps working. The whole JSON is only kept,
+    encoded, when the projection asks for it.
+    """
+
+    FIELDS = ('id_str', 'text', 'created_at', 'in_reply_to_status_id_str',
+              'in_reply_to_user_id_str', 'in_reply_to_screen_name',
+              'retweet_count', 'favorite_count', 'lang', 'source')
+
+    __slots__ = FIELDS + ('user', '_raw')
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    @property
+    def raw(self):
+        if getattr(self, '_raw', None) is None:
+            return None
+        return json.loads(self._raw)
+
+
+class TwrProjection:
+    """ Turns decoded statuses into TwrTweet with the chosen fields.
+
+    Users are interned by id, every tweet from the same author shares
+    one TwrUser for as long as any of them is alive.
+    """
+
+    def __init__(self, fields=TwrTweet.FIELDS, user_fields=TwrUser.FIELDS,
+                 raw=False):
+        for field in fields:
+            if field not in TwrTweet.FIELDS:
+                raise ValueError('%s is not a TwrTweet field' % field)
+        for field in user_fields:
+            if field not in TwrUser.FIELDS:
+                raise ValueError('%s is not a TwrUser field' % field)
+
+        self._fields = tuple(fields)
+        self._user_fields = tuple(user_fields)
+        self._raw = raw
+        self._users = weakref.WeakValueDictionary()
+
+    def decode(self, info):
+        """ Projects a status, a list of them or a search response. """
+        if isinstance(info, list):
+            return [self.tweet(status) for status in info]
+
+        if 'statuses' in info:
+            info = dict(info)
+            info['statuses'] = [self.tweet(status)
+                                for status in info['statuses']]
+            return info
+
+        return self.tweet(info)
+
+    def tweet(self, status):
+        tweet = TwrTweet()
+
+        for field in self._fields:
+            if field in status:
+                setattr(tweet, field, status[field])
+
+        tweet.user = None
+        if 'user' in status:
+            tweet.user = self.user(status['user'])
+
+        if self._raw:
+            tweet._raw = json.dumps(status)
+
+        return tweet
+
+    def user(self, info):
+        key = info.get('id_str')
+        if key is not None:
+            user = self._users.get(key)
+            if user is not None:
+                return user
+
+        user = TwrUser()
+        for field in self._user_fields:
+            if field in info:
+                setattr(user, field, info[field])
+
+        if key is not None:
+            self._users[key] = user
+        return user
@@ -0,0 +1,151 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+from gi.repository import GObject
+
+_pycurl = None
+
+
+def get_pycurl():
+    """ pycurl, imported on first use since loading libcurl is not free. """
+    global _pycurl
+    if _pycurl is None:
+        import pycurl
+        _pycurl = pycurl
+    return _pycurl
+
+
+class TwrMulti:
+    """ Shared pycurl.CurlMulti driven by the GLib main loop. """
+
+    MAX_HOST_CONNECTIONS = 4
+    # connections kept open between transfers, for every host
+    MAX_CONNECTS = 16
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrMulti()
+        return cls._default
+
+    def __init__(self):
+        pycurl = get_pycurl()
+
+        self._multi = pycurl.CurlMulti()
+        self._multi.setopt(pycurl.M_SOCKETFUNCTION, self.__socket_cb)
+        self._multi.setopt(pycurl.M_TIMERFUNCTION, self.__timer_cb)
+
+        # extra transfers to the same host wait for a free connection
+        if hasattr(pycurl, 'M_MAX_HOST_CONNECTIONS'):
+            self._multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS,
+                               self.MAX_HOST_CONNECTIONS)
+
+        if hasattr(pycurl, 'M_MAXCONNECTS'):
+            self._multi.setopt(pycurl.M_MAXCONNECTS, self.MAX_CONNECTS)
+
+        self._handles = {}
+        self._watches = {}
+        self._timeout_id = None
+
+    def add(self, c, done_cb):
+        self._handles[c] = done_cb
+        self._multi.add_handle(c)
+
+    def remove(self, c):
+        if c in self._handles:
+            del self._handles[c]
+            self._multi.remove_handle(c)
+
+    def running(self):
+        return len(self._handles)
+
+    def __socket_cb(self, event, fd, multi, data):
+        pycurl = get_pycurl()
+
+        if fd in self._watches:
+            GObject.source_remove(self._watches.pop(fd))
+
+        if event == pycurl.POLL_REMOVE:
+            return
+
+        condition = GObject.IO_ERR | GObject.IO_HUP
+        if event in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            condition |= GObject.IO_IN
+        if event in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            condition |= GObject.IO_OUT
+
+        self._watches[fd] = GObject.io_add_watch(fd, condition, self.__io_cb)
+
+    def __timer_cb(self, msecs):
+        if self._timeout_id is not None:
+            GObject.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+        if msecs >= 0:
+            self._timeout_id = GObject.timeout_add(msecs, self.__timeout_cb)
+
+    def __io_cb(self, fd, condition):
+        pycurl = get_pycurl()
+
+        flags = 0
+        if condition & GObject.IO_IN:
+            flags |= pycurl.CSELECT_IN
+        if condition & GObject.IO_OUT:
+            flags |= pycurl.CSELECT_OUT
+        if condition & (GObject.IO_ERR | GObject.IO_HUP):
+            flags |= pycurl.CSELECT_ERR
+
+        self._socket_action(fd, flags)
+
+        # libcurl tells us through __socket_cb when to drop the watch
+        return fd in self._watches
+
+    def __timeout_cb(self):
+        self._timeout_id = None
+        self._socket_action(get_pycurl().SOCKET_TIMEOUT, 0)
+        return False
+
+    def _socket_action(self, fd, flags):
+        pycurl = get_pycurl()
+
+        while True:
+            ret, running = self._multi.socket_action(fd, flags)
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+
+        self._read_done()
+
+    def _read_done(self):
+        while True:
+            queued, ok_list, err_list = self._multi.info_read()
+
+            for c in ok_list:
+                self._done(c, None)
+            for c, errno, errmsg in err_list:
+                self._done(c, get_pycurl().error(errno, errmsg))
+
+            if queued == 0:
+                break
+
+    def _done(self, c, error):
+        done_cb = self._handles.pop(c, None)
+        self._multi.remove_handle(c)
+
+        if done_cb is not None:
+            done_cb(c, error)
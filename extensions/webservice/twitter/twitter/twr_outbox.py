@@ -0,0 +1,378 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+
+from gi.repository import GObject
+
+from twitter import TwrStatus
+from twitter import TwrTimeline
+from twr_retry import TwrRetryPolicy
+
+_ERRNO = re.compile(r'^\((\d+),')
+_URL = re.compile(r'https?://\S+')
+
+
+def _words(text):
+    # links come back shortened and media adds one of its own
+    return _URL.sub('', text).split()
+
+
+class TwrOutbox(GObject.GObject):
+    """ Durable queue of status updates, destroys and retweets.
+
+    Every item is journaled to its own file, with a copy of its media,
+    before anything is sent, so nothing is lost while offline or across
+    restarts. Items are keyed by a client side idempotency key and the
+    queue drains a few at a time, retrying until the network comes back.
+
+    Updates and retweets are not idempotent. They are only sent again
+    when they surely never reached the server. Otherwise they become
+    UNKNOWN and the server is asked whether they went out first.
+    """
+
+    UPDATE = 'update'
+    DESTROY = 'destroy'
+    RETWEET = 'retweet'
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    UNKNOWN = 'unknown'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    # home timeline statuses looked at to find an update that went out
+    CHECK_COUNT = 50
+
+    MAX_CONCURRENT = 2
+    MIN_RETRY = 30
+    MAX_RETRY = 30 * 60
+
+    __gsignals__ = {
+        'queue-changed':        (GObject.SignalFlags.RUN_FIRST,
+                                None, ([int])),
+        'item-state-changed':   (GObject.SignalFlags.RUN_FIRST,
+                                None, ([str, str])),
+        'item-sent':            (GObject.SignalFlags.RUN_FIRST,
+                                None, ([object, object])),
+        'item-failed':          (GObject.SignalFlags.RUN_FIRST,
+                                None, ([object, str]))}
+
+    def __init__(self, path, account=None):
+        GObject.GObject.__init__(self)
+
+        self._path = path
+        self._account = account
+        self._items = {}
+        self._buffers = {}
+        self._sending = set()
+        self._retry = self.MIN_RETRY
+        self._retry_id = None
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self._load()
+        GObject.idle_add(self.drain)
+
+    def update(self, status, filepath=None, reply_status_id=None,
+               key=None, data=None, buffer=None):
+        item = {'action': self.UPDATE,
+                'status': status,
+                'reply_status_id': reply_status_id,
+                'media': filepath is not None or buffer is not None}
+        return self._queue(item, key, data, filepath, buffer)
+
+    def destroy(self, status_id, key=None, data=None):
+        item = {'action': self.DESTROY, 'status_id': status_id}
+        return self._queue(item, key, data)
+
+    def retweet(self, status_id, key=None, data=None):
+        item = {'action': self.RETWEET, 'status_id': status_id}
+        return self._queue(item, key, data)
+
+    def get_depth(self):
+        return len([item for item in self._items.values()
+                    if item['state'] in (self.PENDING, self.SENDING,
+                                         self.UNKNOWN)])
+
+    def get_state(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        return item['state']
+
+    def discard(self, key):
+        item = self._items.pop(key, None)
+        self._buffers.pop(key, None)
+        if item is not None:
+            self._remove(item)
+            self.emit('queue-changed', self.get_depth())
+
+    def drain(self):
+        pending = sorted([item for item in self._items.values()
+                          if item['state'] in (self.PENDING, self.UNKNOWN)
+                          and item['key'] not in self._sending],
+                         key=lambda item: item['created'])
+
+        for item in pending:
+            if len(self._sending) >= self.MAX_CONCURRENT:
+                break
+            self._send(item)
+
+        return False
+
+    def _queue(self, item, key, data, filepath=None, buffer=None):
+        if key is None:
+            key = uuid.uuid4().hex
+
+        # the same key is only ever sent once while it is queued
+        if key in self._items:
+            return key
+
+        item.update({'key': key,
+                     'data': data,
+                     'state': self.PENDING,
+                     'created': time.time(),
+                     'attempts': 0})
+
+        if buffer is not None:
+            self._write(self._media_path(item), buffer)
+            # uploads go from memory, the copy on disk is for restarts
+            self._buffers[key] = buffer
+        elif filepath is not None:
+            shutil.copyfile(filepath, self._media_path(item))
+
+        self._items[key] = item
+        self._save(item)
+
+        self.emit('queue-changed', self.get_depth())
+        self.drain()
+
+        return key
+
+    def _send(self, item):
+        self._sending.add(item['key'])
+
+        if item['state'] == self.UNKNOWN:
+            self._check(item)
+            return
+
+        item['attempts'] += 1
+        self._set_state(item, self.SENDING)
+
+        if item['action'] == self.UPDATE:
+            status = TwrStatus(account=self._account)
+            status.connect('status-updated', self.__sent_cb, item)
+            status.connect('status-updated-failed', self.__failed_cb, item)
+            if item['media']:
+                status.update_with_media(item['status'],
+                                         self._media_path(item),
+                                         item['reply_status_id'],
+                                         chunked=True,
+                                         buffer=self._buffers.get(
+                                             item['key']))
+            else:
+                status.update(item['status'], item['reply_status_id'])
+
+        elif item['action'] == self.DESTROY:
+            status = TwrStatus(item['status_id'], self._account)
+            status.connect('status-destroyed', self.__sent_cb, item)
+            status.connect('status-destroyed-failed', self.__failed_cb, item)
+            status.destroy()
+
+        else:
+            status = TwrStatus(item['status_id'], self._account)
+            status.connect('retweet-created', self.__sent_cb, item)
+            status.connect('retweet-created-failed', self.__failed_cb, item)
+            status.retweet()
+
+    def _check(self, item):
+        if item['action'] == self.RETWEET:
+            status = TwrStatus(item['status_id'], self._account)
+            status.connect('status-downloaded', self.__retweet_checked_cb,
+                           item)
+            status.connect('status-downloaded-failed',
+                           self.__check_failed_cb, item)
+            status.show()
+            return
+
+        timeline = TwrTimeline(account=self._account)
+        timeline.connect('timeline-downloaded', self.__update_checked_cb, item)
+        timeline.connect('timeline-downloaded-failed',
+                         self.__check_failed_cb, item)
+        timeline.home_timeline(self.CHECK_COUNT)
+
+    def __retweet_checked_cb(self, status, info, item):
+        # retweeted is seen from the authenticating user
+        if info.get('retweeted'):
+            self.__sent_cb(status, info, item)
+            return
+
+        self._resend(item)
+
+    def __update_checked_cb(self, timeline, tweets, item):
+        words = _words(item['status'])
+        for tweet in tweets:
+            if _words(tweet['text']) == words:
+                self.__sent_cb(timeline, tweet, item)
+                return
+
+        self._resend(item)
+
+    def __check_failed_cb(self, object, message, item):
+        self._sending.discard(item['key'])
+        self._retry_later()
+
+    def _resend(self, item):
+        self._sending.discard(item['key'])
+
+        # a duplicate answer to this one means the first one made it
+        item['uncertain'] = True
+        self._set_state(item, self.PENDING)
+        self.drain()
+
+    def __sent_cb(self, status, info, item):
+        self._sending.discard(item['key'])
+        self._retry = self.MIN_RETRY
+
+        del self._items[item['key']]
+        self._buffers.pop(item['key'], None)
+        self._remove(item)
+        item['state'] = self.SENT
+
+        self.emit('item-state-changed', item['key'], self.SENT)
+        self.emit('item-sent', item, info)
+        self.emit('queue-changed', self.get_depth())
+
+        self.drain()
+
+    def __failed_cb(self, status, message, item):
+        self._sending.discard(item['key'])
+
+        if self._already_done(item, message):
+            info = {}
+            if item['action'] != self.UPDATE:
+                info = {'id_str': item['status_id']}
+            self.__sent_cb(status, info, item)
+            return
+
+        # the server said no, sending it again will not help, nor should
+        # it keep the key from being queued again
+        if message.startswith('HTTP code 4') and \
+           message != 'HTTP code 429':
+            del self._items[item['key']]
+            self._buffers.pop(item['key'], None)
+            self._remove(item)
+            item['state'] = self.FAILED
+
+            self.emit('item-state-changed', item['key'], self.FAILED)
+            self.emit('item-failed', item, message)
+            self.emit('queue-changed', self.get_depth())
+            return
+
+        if item['action'] == self.DESTROY or self._never_sent(message):
+            self._set_state(item, self.PENDING)
+        else:
+            self._set_state(item, self.UNKNOWN)
+
+        self._retry_later()
+
+    def _never_sent(self, message):
+        # the same requests TwrRetryPolicy sends again for any method
+        if message == 'HTTP code 429':
+            return True
+
+        match = _ERRNO.match(message)
+        return match is not None and \
+            int(match.group(1)) in TwrRetryPolicy.CONNECT_ERRORS
+
+    def _already_done(self, item, message):
+        if item['action'] == self.DESTROY:
+            return message == 'HTTP code 404'
+
+        # duplicate status or already retweeted
+        return item.get('uncertain', False) and message == 'HTTP code 403'
+
+    def _retry_later(self):
+        if self._retry_id is None:
+            self._retry_id = GObject.timeout_add_seconds(self._retry,
+                                                         self.__retry_cb)
+            self._retry = min(self._retry * 2, self.MAX_RETRY)
+
+    def __retry_cb(self):
+        self._retry_id = None
+        return self.drain()
+
+    def _set_state(self, item, state):
+        item['state'] = state
+        self._save(item)
+        self.emit('item-state-changed', item['key'], state)
+
+    def _load(self):
+        for name in os.listdir(self._path):
+            if not name.endswith('.json'):
+                continue
+
+            try:
+                with open(os.path.join(self._path, name)) as journal:
+                    item = json.load(journal)
+            except (IOError, ValueError), e:
+                print 'TwrOutbox._load crashed with %s' % str(e)
+                continue
+
+            # left behind by older versions, failed items are not kept
+            if item['state'] == self.FAILED:
+                self._remove(item)
+                continue
+
+            # whatever was on its way when we stopped may have made it
+            if item['state'] == self.SENDING:
+                if item['action'] == self.DESTROY:
+                    item['state'] = self.PENDING
+                else:
+                    item['state'] = self.UNKNOWN
+
+            self._items[item['key']] = item
+
+    def _save(self, item):
+        self._write(self._item_path(item), json.dumps(item))
+
+    def _write(self, path, data):
+        with open('%s.tmp' % path, 'wb') as journal:
+            journal.write(data)
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.rename('%s.tmp' % path, path)
+
+    def _remove(self, item):
+        media_path = self._media_path(item)
+        for path in (self._item_path(item), media_path,
+                     '%s.upload' % media_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _item_path(self, item):
+        return os.path.join(self._path, '%s.json' % item['key'])
+
+    def _media_path(self, item):
+        return os.path.join(self._path, '%s.media' % item['key'])
@@ -0,0 +1,160 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+from gi.repository import GObject
+
+from twitter import TwrSearch
+from twitter import TwrTimeline
+
+
+class TwrPager(GObject.GObject):
+
+    MENTIONS = 'mentions'
+    HOME = 'home'
+    SEARCH = 'search'
+
+    PAGE_COUNT = 200
+
+    # pages in flight across all pagers, None means no limit
+    MAX_CONCURRENT = None
+
+    __gsignals__ = {
+        'page-downloaded':          (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([object])),
+        'pages-completed':          (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([object])),
+        'pages-downloaded-failed':  (GObject.SignalFlags.RUN_FIRST,
+                                    None, ([str]))}
+
+    _running = 0
+    _waiting = []
+
+    def __init__(self, kind, since_id=None, q=None,
+                 count=PAGE_COUNT, max_pages=None, projection=None,
+                 account=None):
+        GObject.GObject.__init__(self)
+
+        self._kind = kind
+        self._account = account
+        self._projection = projection
+        self._q = q
+        self._count = count
+        self._max_pages = max_pages
+
+        self._since_id = None
+        if since_id is not None:
+            self._since_id = int(since_id)
+
+        self._max_id = None
+        self._newest_id = None
+        self._pages = 0
+        self._seen = set()
+
+    def start(self):
+        self._queue_page()
+
+    def _queue_page(self):
+        if TwrPager.MAX_CONCURRENT is not None and \
+           TwrPager._running >= TwrPager.MAX_CONCURRENT:
+            TwrPager._waiting.append(self)
+            return
+
+        TwrPager._running += 1
+        self._fetch_page()
+
+    def _page_done(self):
+        TwrPager._running -= 1
+
+        if TwrPager._waiting:
+            TwrPager._waiting.pop(0)._queue_page()
+
+    def _fetch_page(self):
+        if self._kind == self.SEARCH:
+            source = TwrSearch(projection=self._projection,
+                               account=self._account)
+            source.connect('tweets-downloaded', self.__downloaded_cb)
+            source.connect('tweets-downloaded-failed', self.__failed_cb)
+            source.tweets(self._q, self._count, self._since_id, self._max_id)
+            return
+
+        source = TwrTimeline(projection=self._projection,
+                             account=self._account)
+        if self._kind == self.MENTIONS:
+            source.connect('mentions-downloaded', self.__downloaded_cb)
+            source.connect('mentions-downloaded-failed', self.__failed_cb)
+            source.mentions_timeline(self._count, self._since_id,
+                                     self._max_id)
+        else:
+            source.connect('timeline-downloaded', self.__downloaded_cb)
+            source.connect('timeline-downloaded-failed', self.__failed_cb)
+            source.home_timeline(self._count, self._since_id, self._max_id)
+
+    def __downloaded_cb(self, source, info):
+        self._page_done()
+
+        try:
+            page, lowest_id = self._read_page(info)
+        except (KeyError, TypeError, ValueError), e:
+            # callers wait for one of the final signals
+            self.emit('pages-downloaded-failed', str(e))
+            return
+
+        self._pages += 1
+        if page:
+            self.emit('page-downloaded', page)
+
+        if lowest_id is None or \
+           (self._since_id is not None and lowest_id - 1 <= self._since_id) or \
+           (self._max_pages is not None and self._pages >= self._max_pages):
+            newest_id = None
+            if self._newest_id is not None:
+                newest_id = str(self._newest_id)
+            self.emit('pages-completed', newest_id)
+            return
+
+        # walk backwards from the oldest tweet seen so far
+        self._max_id = lowest_id - 1
+        self._queue_page()
+
+    def _read_page(self, info):
+        if self._kind == self.SEARCH:
+            info = info['statuses']
+
+        page = []
+        lowest_id = None
+        for tweet in info:
+            tweet_id = int(tweet['id_str'])
+
+            if lowest_id is None or tweet_id < lowest_id:
+                lowest_id = tweet_id
+
+            if tweet_id in self._seen:
+                continue
+            if self._since_id is not None and tweet_id <= self._since_id:
+                continue
+
+            self._seen.add(tweet_id)
+            page.append(tweet)
+
+            if self._newest_id is None or tweet_id > self._newest_id:
+                self._newest_id = tweet_id
+
+        return page, lowest_id
+
+    def __failed_cb(self, source, message):
+        self._page_done()
+        self.emit('pages-downloaded-failed', message)
@@ -0,0 +1,145 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import time
+
+from gi.repository import GObject
+from urlparse import urlparse
+
+from twr_multi import get_pycurl
+
+
+class TwrPool:
+    """ Keeps finished Curl handles around to save setting them up again.
+
+    Transfers run on the shared TwrMulti, so connections live in its
+    connection cache, not in these handles. Idle connections are closed
+    by libcurl past MAXAGE_CONN. hits and misses count transfers that
+    reused a connection and transfers that had to open one.
+    """
+
+    IDLE_TIMEOUT = 60
+    MAX_IDLE_PER_HOST = 4
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrPool()
+        return cls._default
+
+    def __init__(self):
+        pycurl = get_pycurl()
+
+        self._share = pycurl.CurlShare()
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+        self._idle = {}
+        self._hosts = {}
+        self._evict_id = None
+
+        self.hits = 0
+        self.misses = 0
+        self.handles = 0
+        self.evictions = 0
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        idle = self._idle.get(host)
+
+        if idle:
+            c, released = idle.pop()
+        else:
+            c = get_pycurl().Curl()
+            self.handles += 1
+
+        self._hosts[c] = host
+        self._setup(c)
+
+        return c
+
+    def release(self, c):
+        host = self._hosts.pop(c, None)
+        self._count_connects(c)
+
+        # drop callbacks and per-request options, keep the connection
+        c.reset()
+
+        idle = self._idle.get(host, [])
+        if host is None or len(idle) >= self.MAX_IDLE_PER_HOST:
+            c.close()
+            self.evictions += 1
+            return
+
+        idle.append((c, time.time()))
+        self._idle[host] = idle
+
+        if self._evict_id is None:
+            self._evict_id = GObject.timeout_add_seconds(self.IDLE_TIMEOUT,
+                                                         self.__evict_cb)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'handles': self.handles,
+                'evictions': self.evictions,
+                'idle': sum([len(idle) for idle in self._idle.values()])}
+
+    def _count_connects(self, c):
+        pycurl = get_pycurl()
+
+        # nothing came back, it says nothing about the connection
+        if not c.getinfo(pycurl.HTTP_CODE):
+            return
+
+        if c.getinfo(pycurl.NUM_CONNECTS) == 0:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def _setup(self, c):
+        pycurl = get_pycurl()
+
+        c.setopt(pycurl.SHARE, self._share)
+
+        if hasattr(pycurl, 'MAXAGE_CONN'):
+            c.setopt(pycurl.MAXAGE_CONN, self.IDLE_TIMEOUT)
+
+        if hasattr(pycurl, 'TCP_KEEPALIVE'):
+            c.setopt(pycurl.TCP_KEEPALIVE, 1)
+            c.setopt(pycurl.TCP_KEEPIDLE, self.IDLE_TIMEOUT)
+            c.setopt(pycurl.TCP_KEEPINTVL, self.IDLE_TIMEOUT)
+
+    def __evict_cb(self):
+        deadline = time.time() - self.IDLE_TIMEOUT
+
+        for host, idle in self._idle.items():
+            for c, released in idle[:]:
+                if released <= deadline:
+                    idle.remove((c, released))
+                    c.close()
+                    self.evictions += 1
+            if not idle:
+                del self._idle[host]
+
+        if self._idle:
+            return True
+
+        self._evict_id = None
+        return False
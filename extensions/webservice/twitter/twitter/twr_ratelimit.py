@@ -0,0 +1,163 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import time
+
+from gi.repository import GObject
+from urlparse import urlparse
+
+
+def endpoint_family(url):
+    """ https://api.twitter.com/1.1/statuses/retweet/1.json becomes
+    statuses/retweet """
+    parts = urlparse(url).path.strip('/').split('/')
+
+    if parts[0] == '1.1':
+        parts = parts[1:]
+
+    parts[-1] = parts[-1].split('.')[0]
+    if len(parts) > 1 and parts[-1].isdigit():
+        parts = parts[:-1]
+
+    return '/'.join(parts)
+
+
+class TwrRateLimiter:
+    """ Per endpoint family budgets taken from the x-rate-limit headers.
+
+    Requests to a family whose window is exhausted are queued until the
+    window resets instead of being sent to collect a 429.
+    """
+
+    # when a 429 comes without headers
+    DEFAULT_WINDOW = 15 * 60
+
+    _default = None
+    _limiters = {}
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrRateLimiter()
+        return cls._default
+
+    @classmethod
+    def get_for(cls, key):
+        if key not in cls._limiters:
+            cls._limiters[key] = TwrRateLimiter()
+        return cls._limiters[key]
+
+    def __init__(self):
+        self._budgets = {}
+        self._waiting = {}
+        self._timeouts = {}
+
+    def schedule(self, url, start_cb, *args):
+        family = endpoint_family(url)
+
+        if family in self._waiting or not self._take(family):
+            self._waiting.setdefault(family, []).append((start_cb, args))
+            self._wait(family)
+            return False
+
+        start_cb(*args)
+        return True
+
+    def update(self, url, code, headers):
+        family = endpoint_family(url)
+
+        try:
+            remaining = int(headers['x-rate-limit-remaining'])
+            limit = int(headers['x-rate-limit-limit'])
+            reset = int(headers['x-rate-limit-reset'])
+        except (KeyError, ValueError):
+            if code != 429:
+                return
+            budget = self._budgets.get(family, {})
+            remaining = 0
+            limit = budget.get('limit', 0)
+            reset = int(time.time()) + self.DEFAULT_WINDOW
+
+        if code == 429:
+            remaining = 0
+
+        self._budgets[family] = {'remaining': remaining,
+                                 'limit': limit,
+                                 'reset': reset}
+
+    def budget(self, url_or_family):
+        family = url_or_family
+        if '://' in family:
+            family = endpoint_family(family)
+
+        budget = self._budgets.get(family)
+        if budget is None:
+            return None
+
+        self._refill(budget)
+        return dict(budget, waiting=len(self._waiting.get(family, [])))
+
+    def budgets(self):
+        return dict([(family, self.budget(family))
+                     for family in self._budgets.keys()])
+
+    def _refill(self, budget):
+        if budget['reset'] > time.time():
+            return
+
+        # a new window, the next response tells its real size
+        budget['remaining'] = max(budget['limit'], 1)
+        budget['reset'] = int(time.time()) + self.DEFAULT_WINDOW
+
+    def _take(self, family):
+        budget = self._budgets.get(family)
+        if budget is None:
+            return True
+
+        self._refill(budget)
+        if budget['remaining'] <= 0:
+            return False
+
+        # reserved until the response headers tell the real number
+        budget['remaining'] -= 1
+        return True
+
+    def _wait(self, family):
+        if family in self._timeouts:
+            return
+
+        budget = self._budgets.get(family)
+        delay = 1
+        if budget is not None:
+            delay = max(int(budget['reset'] - time.time()) + 1, 1)
+
+        self._timeouts[family] = GObject.timeout_add_seconds(
+            delay, self.__window_reset_cb, family)
+
+    def __window_reset_cb(self, family):
+        del self._timeouts[family]
+
+        waiting = self._waiting.pop(family, [])
+        while waiting and self._take(family):
+            start_cb, args = waiting.pop(0)
+            start_cb(*args)
+
+        if waiting:
+            self._waiting[family] = waiting
+            self._wait(family)
+
+        return False
@@ -0,0 +1,77 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import random
+
+from twr_ratelimit import endpoint_family
+
+
+class TwrRetryPolicy:
+    """ Decides whether a failed transfer is attempted again and when.
+
+    GET requests are retried on any transient failure. POST requests are
+    only retried when the server can not have acted on them, ie. the
+    connection was never made or the request was rate limited, so a
+    statuses/update is never posted twice. Delays grow exponentially
+    with full jitter.
+    """
+
+    # libcurl error numbers, spelled out so pycurl is only loaded once
+    # a transfer is made
+
+    # the request never left this machine, E_COULDNT_RESOLVE_PROXY,
+    # E_COULDNT_RESOLVE_HOST, E_COULDNT_CONNECT and E_SSL_CONNECT_ERROR
+    CONNECT_ERRORS = (5, 6, 7, 35)
+
+    # the request may have reached the server, E_OPERATION_TIMEOUTED,
+    # E_PARTIAL_FILE, E_GOT_NOTHING, E_SEND_ERROR and E_RECV_ERROR
+    TRANSFER_ERRORS = (28, 18, 52, 55, 56)
+
+    # rejected before being processed
+    REJECTED_CODES = (429,)
+
+    TRANSIENT_CODES = (500, 502, 503, 504)
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0,
+                 idempotent=('statuses/destroy', 'media/upload')):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idempotent = set(idempotent)
+
+    def retry_delay(self, method, url, attempt, error=None, code=None):
+        """ Seconds to wait before the next attempt, None to give up. """
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if not self._should_retry(method, url, error, code):
+            return None
+
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _should_retry(self, method, url, error, code):
+        errno = None
+        if error is not None:
+            errno = error.args[0]
+
+        if errno in self.CONNECT_ERRORS or code in self.REJECTED_CODES:
+            return True
+
+        if method != 'GET' and endpoint_family(url) not in self.idempotent:
+            return False
+
+        return errno in self.TRANSFER_ERRORS or code in self.TRANSIENT_CODES
@@ -0,0 +1,95 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import time
+import hmac
+import urllib
+import hashlib
+import binascii
+
+NONCE_BYTES = 16
+
+
+def percent(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return urllib.quote(str(value), safe='~')
+
+
+def encode_params(params):
+    """ UTF-8 encodes unicode values, urllib.urlencode can not. """
+    if params is None:
+        return None
+
+    return [(k, v.encode('utf-8') if isinstance(v, unicode) else v)
+            for k, v in params]
+
+
+class TwrSigner:
+    """ OAuth 1.0 HMAC-SHA1 signer for one set of secrets.
+
+    The HMAC key and the percent encoded oauth_* fields are computed once,
+    so signing a request only encodes its own parameters.
+    """
+
+    def __init__(self, c_key, c_secret, a_key, a_secret):
+        key = '%s&%s' % (percent(c_secret), percent(a_secret))
+        self._hmac = hmac.new(key, digestmod=hashlib.sha1)
+
+        self._oauth_params = [
+            ('oauth_consumer_key', percent(c_key)),
+            ('oauth_signature_method', 'HMAC-SHA1'),
+            ('oauth_token', percent(a_key)),
+            ('oauth_version', '1.0')]
+
+    def authorization_header(self, method, url, params, nonce=None,
+                             timestamp=None):
+        if nonce is None:
+            nonce = binascii.hexlify(os.urandom(NONCE_BYTES))
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        # nonce and timestamp never need encoding
+        encoded = self._oauth_params + \
+            [('oauth_nonce', nonce), ('oauth_timestamp', str(timestamp))] + \
+            [(percent(k), percent(v)) for k, v in params]
+        encoded.sort()
+
+        raw = '&'.join((method,
+                        percent(url),
+                        percent('&'.join(['%s=%s' % kv for kv in encoded]))))
+
+        hashed = self._hmac.copy()
+        hashed.update(raw)
+        signature = binascii.b2a_base64(hashed.digest())[:-1]
+
+        encoded.append(('oauth_signature', percent(signature)))
+        encoded.sort()
+
+        return 'OAuth %s' % ', '.join(['%s="%s"' % kv for kv in encoded])
+
+    def authorization_headers(self, requests):
+        """ Signs (method, url, params) tuples sharing one timestamp. """
+        timestamp = int(time.time())
+        nonces = binascii.hexlify(os.urandom(NONCE_BYTES * len(requests)))
+        size = NONCE_BYTES * 2
+
+        return [self.authorization_header(method, url, params,
+                                          nonces[i * size:(i + 1) * size],
+                                          timestamp)
+                for i, (method, url, params) in enumerate(requests)]
@@ -0,0 +1,124 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import json
+import bisect
+
+# upper bounds in milliseconds, anything slower lands in the last bucket
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500,
+           1000, 2000, 5000, 10000, 30000)
+
+# curl times, all measured from the start of the transfer
+TIMINGS = ('namelookup', 'connect', 'appconnect', 'starttransfer', 'total')
+
+
+class _TwrEndpointStats:
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.retried = 0
+        self.size_download = 0
+        self.size_upload = 0
+        self.sums = dict([(timing, 0.0) for timing in TIMINGS])
+        self.histograms = dict([(timing, [0] * (len(BUCKETS) + 1))
+                                for timing in TIMINGS])
+
+
+class TwrStats:
+    """ Per endpoint histograms of the transfer-stats TwrObject emits. """
+
+    _default = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = TwrStats()
+        return cls._default
+
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, stats):
+        endpoint = self._endpoints.setdefault(stats['endpoint'],
+                                              _TwrEndpointStats())
+        endpoint.count += 1
+        endpoint.size_download += stats['size_download']
+        endpoint.size_upload += stats['size_upload']
+        if stats['retries']:
+            endpoint.retried += 1
+        if stats['error'] is not None or not 200 <= stats['code'] < 400:
+            endpoint.failures += 1
+
+        for timing in TIMINGS:
+            milliseconds = stats[timing] * 1000
+            endpoint.sums[timing] += milliseconds
+            endpoint.histograms[timing][bisect.bisect_left(BUCKETS,
+                                                           milliseconds)] += 1
+
+    def endpoints(self):
+        return sorted(self._endpoints.keys())
+
+    def histogram(self, endpoint, timing='total'):
+        """ (upper bound in ms or None, transfers) pairs. """
+        counts = self._endpoints[endpoint].histograms[timing]
+        return zip(BUCKETS + (None,), counts)
+
+    def percentile(self, endpoint, percent, timing='total'):
+        """ Upper bound of the bucket holding that percentile. """
+        stats = self._endpoints[endpoint]
+        wanted = stats.count * percent / 100.0
+
+        seen = 0
+        for bound, count in self.histogram(endpoint, timing):
+            seen += count
+            if count and seen >= wanted:
+                return bound
+        return None
+
+    def summary(self):
+        summary = {}
+
+        for name, stats in self._endpoints.items():
+            timings = {}
+            for timing in TIMINGS:
+                timings[timing] = {
+                    'mean': stats.sums[timing] / stats.count,
+                    'p50': self.percentile(name, 50, timing),
+                    'p90': self.percentile(name, 90, timing),
+                    'p99': self.percentile(name, 99, timing),
+                    'histogram': stats.histograms[timing]}
+
+            summary[name] = {'count': stats.count,
+                             'failures': stats.failures,
+                             'retried': stats.retried,
+                             'size_download': stats.size_download,
+                             'size_upload': stats.size_upload,
+                             'timings': timings}
+
+        return summary
+
+    def dump(self, path=None):
+        data = json.dumps({'buckets': BUCKETS, 'endpoints': self.summary()},
+                          indent=4, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as dump:
+                dump.write(data)
+        return data
+
+    def reset(self):
+        self._endpoints = {}
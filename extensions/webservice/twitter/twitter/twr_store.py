@@ -0,0 +1,227 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import re
+import struct
+import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id_str TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    in_reply_to_status_id_str TEXT,
+    uid TEXT,
+    user_name TEXT,
+    text TEXT,
+    created_at TEXT);
+CREATE INDEX IF NOT EXISTS tweets_reply
+    ON tweets (in_reply_to_status_id_str);
+CREATE INDEX IF NOT EXISTS tweets_uid
+    ON tweets (uid, id);
+CREATE TABLE IF NOT EXISTS entries (
+    status_id_str TEXT PRIMARY KEY,
+    uid TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS watermarks (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts
+    USING fts4 (text, user_name);
+"""
+
+_TERM = re.compile(r'[#@]?\w+', re.UNICODE)
+
+
+def _rank(matchinfo):
+    # matchinfo 'pcx', the share of each phrase's hits found in this row
+    info = struct.unpack('%dI' % (len(matchinfo) / 4), str(matchinfo))
+    phrases, columns = info[0], info[1]
+
+    score = 0.0
+    for phrase in range(phrases):
+        for column in range(columns):
+            base = 2 + 3 * (phrase * columns + column)
+            if info[base]:
+                score += float(info[base]) / info[base + 1]
+
+    return score
+
+
+class TwrStoreError(Exception):
+    pass
+
+
+class TwrStore:
+    """ Append only SQLite store of tweets keyed by id_str.
+
+    Tweets can be attached to a Journal entry uid, ie. the replies to
+    the status that entry was shared as. Entries map shared status ids
+    back to their uid, watermarks keep the since_id of each timeline.
+    Every tweet is also full-text indexed for search().
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        try:
+            self._db = sqlite3.connect(path)
+            self._db.executescript(_SCHEMA)
+            self._db.create_function('rank', 1, _rank)
+            self._index_missing()
+        except sqlite3.Error, e:
+            raise TwrStoreError(str(e))
+
+    def add(self, tweets, uid=None):
+        added = 0
+
+        with self._db:
+            for tweet in tweets:
+                cursor = self._db.execute(
+                    'INSERT OR IGNORE INTO tweets VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (tweet['id_str'],
+                     int(tweet['id_str']),
+                     tweet.get('in_reply_to_status_id_str'),
+                     uid,
+                     tweet['user']['name'],
+                     tweet['text'],
+                     tweet.get('created_at')))
+
+                if cursor.rowcount:
+                    self._db.execute(
+                        'INSERT INTO tweets_fts (docid, text, user_name) '
+                        'VALUES (?, ?, ?)',
+                        (cursor.lastrowid,
+                         tweet['text'],
+                         tweet['user']['name']))
+                    added += 1
+                elif uid is not None:
+                    # stored first by a timeline or a search, claim it
+                    cursor = self._db.execute(
+                        'UPDATE tweets SET uid = ? '
+                        'WHERE id_str = ? AND uid IS NULL',
+                        (uid, tweet['id_str']))
+                    added += cursor.rowcount
+
+        return added
+
+    def search(self, query, limit=100):
+        """ Best matching tweets first, newest first among equals. """
+        terms = _TERM.findall(query)
+        if not terms:
+            return []
+
+        # the tokenizer drops # and @, the words are matched and the
+        # hashtags and mentions themselves checked on the text
+        match = ' '.join(['"%s"' % term.lstrip('#@') for term in terms])
+        marked = [term.lower() for term in terms if term[0] in '#@']
+
+        cursor = self._db.execute(
+            'SELECT t.id_str, t.in_reply_to_status_id_str, t.user_name, '
+            't.text, t.created_at FROM tweets_fts f '
+            'JOIN tweets t ON t.rowid = f.docid '
+            'WHERE tweets_fts MATCH ? '
+            'ORDER BY rank(matchinfo(tweets_fts, \'pcx\')) DESC, t.id DESC',
+            (match,))
+
+        tweets = []
+        for id_str, reply_id, user_name, text, created_at in cursor:
+            if marked and not all([term in text.lower() for term in marked]):
+                continue
+
+            tweets.append({'id_str': id_str,
+                           'in_reply_to_status_id_str': reply_id,
+                           'user': {'name': user_name},
+                           'text': text,
+                           'created_at': created_at})
+            if len(tweets) >= limit:
+                break
+
+        return tweets
+
+    def replies(self, uid):
+        cursor = self._db.execute(
+            'SELECT id_str, user_name, text FROM tweets '
+            'WHERE uid = ? ORDER BY id', (uid,))
+        return cursor.fetchall()
+
+    def count(self, uid):
+        cursor = self._db.execute(
+            'SELECT COUNT(*) FROM tweets WHERE uid = ?', (uid,))
+        return cursor.fetchone()[0]
+
+    def last_id(self, uid):
+        cursor = self._db.execute(
+            'SELECT MAX(id) FROM tweets WHERE uid = ?', (uid,))
+        last_id = cursor.fetchone()[0]
+
+        if last_id is None:
+            return None
+        return str(last_id)
+
+    def add_entry(self, status_id, uid):
+        with self._db:
+            cursor = self._db.execute(
+                'INSERT OR IGNORE INTO entries VALUES (?, ?)',
+                (status_id, uid))
+        return cursor.rowcount > 0
+
+    def entries(self, status_ids):
+        entries = {}
+
+        for status_id in status_ids:
+            cursor = self._db.execute(
+                'SELECT uid FROM entries WHERE status_id_str = ?',
+                (status_id,))
+            row = cursor.fetchone()
+            if row is not None:
+                entries[status_id] = row[0]
+
+        return entries
+
+    def oldest_entry(self):
+        cursor = self._db.execute(
+            'SELECT MIN(CAST(status_id_str AS INTEGER)) FROM entries')
+        oldest_id = cursor.fetchone()[0]
+
+        if oldest_id is None:
+            return None
+        return str(oldest_id)
+
+    def get_watermark(self, name):
+        cursor = self._db.execute(
+            'SELECT id FROM watermarks WHERE name = ?', (name,))
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return str(row[0])
+
+    def set_watermark(self, name, id_str):
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO watermarks VALUES (?, ?)',
+                (name, int(id_str)))
+
+    def close(self):
+        self._db.close()
+
+    def _index_missing(self):
+        # tweets stored before the index existed, rowids only grow
+        with self._db:
+            self._db.execute(
+                'INSERT INTO tweets_fts (docid, text, user_name) '
+                'SELECT rowid, text, user_name FROM tweets WHERE rowid > '
+                '(SELECT IFNULL(MAX(docid), 0) FROM tweets_fts)')
@@ -0,0 +1,128 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import re
+import json
+
+_TOKENS = re.compile(r'[\[\]{}",\\]')
+_KEY = re.compile(r'"([^"\\]*)"\s*:\s*$')
+
+
+class TwrJsonStream:
+    """ Decodes the objects of a JSON array while it is being downloaded.
+
+    Every object of the array is handed to object_cb as soon as its closing
+    brace arrives. The array is either the whole document (key=None) or the
+    value of key in the top level object, ie. 'statuses' for search results.
+    Whatever is left once those objects are taken out, ie. [] or
+    {"statuses": [], "search_metadata": {...}} or an errors document, is
+    returned by close().
+    """
+
+    def __init__(self, object_cb, key=None):
+        self._object_cb = object_cb
+        self._key = key
+
+        self._depth = 0
+        self._target = None
+        self._string = False
+        self._escape = False
+
+        self._object = None
+        self._skeleton = []
+
+    def feed(self, data):
+        mark = 0
+        skip = -1
+
+        if self._escape:
+            skip = 0
+            self._escape = False
+
+        for match in _TOKENS.finditer(data):
+            index = match.start()
+            if index == skip:
+                continue
+
+            token = match.group()
+
+            if self._string:
+                if token == '\\':
+                    skip = index + 1
+                    if skip == len(data):
+                        self._escape = True
+                elif token == '"':
+                    self._string = False
+                continue
+
+            if token == '"':
+                self._string = True
+
+            elif token in '[{':
+                self._depth += 1
+
+                if self._object is None:
+                    if token == '{' and self._depth - 1 == self._target:
+                        self._skeleton.append(data[mark:index])
+                        self._object = []
+                        mark = index
+                    elif token == '[' and self._target is None:
+                        self._check_target(data[mark:index])
+
+            elif token in ']}':
+                self._depth -= 1
+
+                if self._object is not None and self._depth == self._target:
+                    self._object.append(data[mark:index + 1])
+                    mark = index + 1
+                    self._emit()
+                elif token == ']' and self._depth + 1 == self._target:
+                    self._target = -1
+
+            elif token == ',':
+                if self._object is None and self._depth == self._target:
+                    self._skeleton.append(data[mark:index])
+                    mark = index + 1
+
+        if self._object is not None:
+            self._object.append(data[mark:])
+        else:
+            self._skeleton.append(data[mark:])
+
+    def close(self):
+        if self._object is not None:
+            raise ValueError('Incomplete object at the end of the stream')
+
+        return json.loads(''.join(self._skeleton))
+
+    def _check_target(self, pending):
+        if self._key is None:
+            if self._depth == 1:
+                self._target = 1
+            return
+
+        if self._depth != 2:
+            return
+
+        match = _KEY.search(''.join(self._skeleton) + pending)
+        if match is not None and match.group(1) == self._key:
+            self._target = 2
+
+    def _emit(self):
+        data = ''.join(self._object)
+        self._object = None
+        self._object_cb(json.loads(data))
@@ -0,0 +1,168 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+""" Spans around the hot paths, exported as Chrome trace JSON.
+
+Off unless TWR_TRACE names the file to export to, at exit or on
+export(). TWR_TRACE_SIZE bounds the events kept, the oldest are dropped
+first. TWR_TRACE_PROFILE lists span names, comma separated, to run
+under cProfile too; their stats go next to the trace as <name>.prof.
+When off, span() hands out one shared no-op span.
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+
+from collections import deque
+
+DEFAULT_SIZE = 10000
+
+
+class _TwrNullSpan(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def end(self, **args):
+        pass
+
+_NULL_SPAN = _TwrNullSpan()
+
+
+class _TwrSpan:
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._profile = tracer._profile_begin(name)
+        self._start = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.end()
+        return False
+
+    def end(self, **args):
+        end = time.time()
+        if self._profile is not None:
+            self._tracer._profile_end(self._name, self._profile)
+            self._profile = None
+        self._args.update(args)
+        self._tracer._record(self._name, self._start, end, self._args)
+
+
+class TwrTracer:
+
+    def __init__(self, path, size=DEFAULT_SIZE, profile=()):
+        self.path = path
+        self._events = deque(maxlen=size)
+        self._profile = set(profile)
+        self._profiling = False
+        self._stats = {}
+        self._pid = os.getpid()
+
+    def span(self, name, args):
+        return _TwrSpan(self, name, args)
+
+    def _record(self, name, start, end, args):
+        self._events.append({'name': name,
+                             'cat': name.split('.')[0],
+                             'ph': 'X',
+                             'ts': int(start * 1000000),
+                             'dur': int((end - start) * 1000000),
+                             'pid': self._pid,
+                             'tid': threading.current_thread().ident,
+                             'args': args})
+
+    def _profile_begin(self, name):
+        # one profiler at a time, nested spans are inside it anyway
+        if name not in self._profile or self._profiling:
+            return None
+
+        import cProfile
+
+        self._profiling = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _profile_end(self, name, profile):
+        import pstats
+
+        profile.disable()
+        self._profiling = False
+
+        if name in self._stats:
+            self._stats[name].add(profile)
+        else:
+            self._stats[name] = pstats.Stats(profile)
+
+    def export(self, path=None):
+        if path is None:
+            path = self.path
+
+        with open(path, 'w') as trace:
+            json.dump({'traceEvents': list(self._events),
+                       'displayTimeUnit': 'ms'}, trace)
+
+        for name, stats in self._stats.items():
+            stats.dump_stats(os.path.join(os.path.dirname(path) or '.',
+                                          '%s.prof' % name))
+
+_tracer = None
+
+
+def span(name, **args):
+    """ Starts a span, ended by end() or by leaving a with block. """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, args)
+
+
+def enable(path, size=DEFAULT_SIZE, profile=()):
+    global _tracer
+    _tracer = TwrTracer(path, size, profile)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    _tracer = None
+
+
+def export(path=None):
+    if _tracer is not None:
+        _tracer.export(path)
+
+
+if os.environ.get('TWR_TRACE'):
+    enable(os.environ['TWR_TRACE'],
+           int(os.environ.get('TWR_TRACE_SIZE', DEFAULT_SIZE)),
+           [name for name in os.environ.get('TWR_TRACE_PROFILE',
+                                            '').split(',') if name])
+    atexit.register(export)
@@ -0,0 +1,89 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+from twr_cache import TwrCache
+
+BODY = 'x' * 100
+FRESH = {'cache-control': 'max-age=60'}
+STALE = {'cache-control': 'max-age=0', 'etag': '"v1"'}
+
+
+class TwrCacheTest(unittest.TestCase):
+
+    def test_hits_keep_size(self):
+        cache = TwrCache(max_bytes=1000)
+        cache.store('a', FRESH, BODY)
+
+        for i in range(20):
+            self.assertNotEqual(cache.lookup('a'), None)
+
+        self.assertEqual(cache.stats()['bytes'], len(BODY))
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_expired_releases_size(self):
+        cache = TwrCache(max_bytes=1000)
+        cache.store('a', FRESH, BODY)
+        cache._memory['a']['stored'] = 0
+
+        self.assertEqual(cache.lookup('a'), None)
+        self.assertEqual(cache.stats()['bytes'], 0)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_store_after_hits(self):
+        cache = TwrCache(max_bytes=1000)
+        cache.store('a', FRESH, BODY)
+        for i in range(20):
+            cache.lookup('a')
+
+        cache.store('b', FRESH, BODY)
+        self.assertNotEqual(cache.lookup('b'), None)
+
+    def test_stale_revalidated(self):
+        cache = TwrCache(max_bytes=1000)
+        cache.store('a', STALE, BODY)
+
+        entry = cache.lookup('a')
+        self.assertFalse(cache.is_fresh(entry))
+        self.assertEqual(cache.validators(entry), ['If-None-Match: "v1"'])
+        self.assertEqual(cache.stats()['bytes'], len(BODY))
+
+    def test_disk_entry_counted_once(self):
+        path = tempfile.mkdtemp()
+        try:
+            TwrCache(path, max_bytes=1000).store('a', FRESH, BODY)
+
+            cache = TwrCache(path, max_bytes=1000)
+            for i in range(5):
+                self.assertEqual(cache.lookup('a')['body'], BODY)
+            self.assertEqual(cache.stats()['bytes'], len(BODY))
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+try:
+    from twr_ratelimit import TwrRateLimiter
+    from twr_ratelimit import endpoint_family
+except ImportError:
+    TwrRateLimiter = None
+
+API = 'https://api.twitter.com/1.1'
+MENTIONS_URL = API + '/statuses/mentions_timeline.json'
+
+
+def _headers(remaining, limit=15, reset=None):
+    if reset is None:
+        reset = int(time.time()) + 600
+    return {'x-rate-limit-remaining': str(remaining),
+            'x-rate-limit-limit': str(limit),
+            'x-rate-limit-reset': str(reset)}
+
+
+@unittest.skipIf(TwrRateLimiter is None, 'needs PyGObject')
+class TwrRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._limiter = TwrRateLimiter()
+        self._started = []
+
+    def _schedule(self, name):
+        return self._limiter.schedule(MENTIONS_URL, self._started.append,
+                                      name)
+
+    def _release(self):
+        # what the GLib timeout does once the window resets
+        self._limiter._TwrRateLimiter__window_reset_cb(
+            'statuses/mentions_timeline')
+
+    def test_endpoint_family(self):
+        self.assertEqual(endpoint_family(MENTIONS_URL),
+                         'statuses/mentions_timeline')
+        self.assertEqual(endpoint_family(API + '/statuses/retweet/1.json'),
+                         'statuses/retweet')
+        self.assertEqual(endpoint_family('https://upload.twitter.com/1.1/'
+                                         'media/upload.json'),
+                         'media/upload')
+
+    def test_unknown_budget_starts(self):
+        self.assertTrue(self._schedule('a'))
+        self.assertEqual(self._started, ['a'])
+        self.assertEqual(self._limiter.budget(MENTIONS_URL), None)
+
+    def test_headers_read(self):
+        self._limiter.update(MENTIONS_URL, 200, _headers(7))
+
+        budget = self._limiter.budget('statuses/mentions_timeline')
+        self.assertEqual(budget['remaining'], 7)
+        self.assertEqual(budget['limit'], 15)
+        self.assertEqual(budget['waiting'], 0)
+
+    def test_calls_reserved(self):
+        self._limiter.update(MENTIONS_URL, 200, _headers(2))
+
+        self.assertTrue(self._schedule('a'))
+        self.assertTrue(self._schedule('b'))
+        self.assertFalse(self._schedule('c'))
+
+        self.assertEqual(self._started, ['a', 'b'])
+        self.assertEqual(self._limiter.budget(MENTIONS_URL)['waiting'], 1)
+
+    def test_429_without_headers(self):
+        self._limiter.update(MENTIONS_URL, 429, {})
+
+        budget = self._limiter.budget(MENTIONS_URL)
+        self.assertEqual(budget['remaining'], 0)
+        self.assertTrue(budget['reset'] > time.time())
+        self.assertFalse(self._schedule('a'))
+
+    def test_waiting_released_in_order(self):
+        self._limiter.update(MENTIONS_URL, 200, _headers(0, limit=2))
+        self._schedule('a')
+        self._schedule('b')
+        self._schedule('c')
+        self.assertEqual(self._started, [])
+
+        self._limiter._budgets['statuses/mentions_timeline']['reset'] = 0
+        self._release()
+
+        self.assertEqual(self._started, ['a', 'b'])
+        self.assertEqual(self._limiter.budget(MENTIONS_URL)['waiting'], 1)
+
+    def test_other_families_unaffected(self):
+        self._limiter.update(MENTIONS_URL, 200, _headers(0))
+
+        self.assertTrue(self._limiter.schedule(API + '/search/tweets.json',
+                                               self._started.append, 'a'))
+        self.assertEqual(self._started, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+try:
+    from twr_retry import TwrRetryPolicy
+except ImportError:
+    TwrRetryPolicy = None
+
+API = 'https://api.twitter.com/1.1'
+UPDATE_URL = API + '/statuses/update.json'
+RETWEET_URL = API + '/statuses/retweet/123.json'
+DESTROY_URL = API + '/statuses/destroy/123.json'
+TIMELINE_URL = API + '/statuses/home_timeline.json'
+
+
+def _error(errno):
+    # what pycurl.error carries, (errno, message)
+    return Exception(errno, 'curl error %d' % errno)
+
+
+@unittest.skipIf(TwrRetryPolicy is None, 'needs PyGObject')
+class TwrRetryPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._policy = TwrRetryPolicy()
+
+    def _delay(self, method, url, error=None, code=None, attempt=0):
+        return self._policy.retry_delay(method, url, attempt, error, code)
+
+    def test_update_never_posted_twice(self):
+        # the server may have acted on these already
+        for errno in TwrRetryPolicy.TRANSFER_ERRORS:
+            self.assertEqual(self._delay('POST', UPDATE_URL, _error(errno)),
+                             None)
+            self.assertEqual(self._delay('POST', RETWEET_URL, _error(errno)),
+                             None)
+
+        for code in TwrRetryPolicy.TRANSIENT_CODES:
+            self.assertEqual(self._delay('POST', UPDATE_URL, code=code), None)
+            self.assertEqual(self._delay('POST', RETWEET_URL, code=code),
+                             None)
+
+    def test_update_retried_when_never_sent(self):
+        for errno in TwrRetryPolicy.CONNECT_ERRORS:
+            self.assertNotEqual(self._delay('POST', UPDATE_URL,
+                                            _error(errno)), None)
+
+        self.assertNotEqual(self._delay('POST', UPDATE_URL, code=429), None)
+
+    def test_idempotent_post_retried(self):
+        self.assertNotEqual(self._delay('POST', DESTROY_URL, _error(56)), None)
+        self.assertNotEqual(self._delay('POST', DESTROY_URL, code=503), None)
+
+    def test_get_retried(self):
+        self.assertNotEqual(self._delay('GET', TIMELINE_URL, _error(28)),
+                            None)
+        self.assertNotEqual(self._delay('GET', TIMELINE_URL, code=500), None)
+
+    def test_client_errors_not_retried(self):
+        for code in (400, 401, 403, 404):
+            self.assertEqual(self._delay('GET', TIMELINE_URL, code=code),
+                             None)
+
+    def test_attempts_run_out(self):
+        last = self._policy.max_attempts - 1
+
+        self.assertEqual(self._delay('GET', TIMELINE_URL, code=503,
+                                     attempt=last), None)
+
+    def test_delay_bounds(self):
+        for attempt in range(self._policy.max_attempts - 1):
+            ceiling = min(self._policy.max_delay,
+                          self._policy.base_delay * (2 ** attempt))
+            for i in range(20):
+                delay = self._delay('GET', TIMELINE_URL, code=503,
+                                    attempt=attempt)
+                self.assertTrue(0 <= delay <= ceiling)
+
+
+if __name__ == '__main__':
+    unittest.main()
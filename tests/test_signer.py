@@ -0,0 +1,59 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+
+import os
+import sys
+import urllib
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+from twr_cache import cache_key
+from twr_signer import TwrSigner
+from twr_signer import encode_params
+
+URL = 'https://api.twitter.com/1.1/search/tweets.json'
+
+
+class TwrSignerTest(unittest.TestCase):
+
+    def test_encode_params(self):
+        params = [('q', u'\xe9cole'), ('count', 20), ('since_id', '1')]
+
+        self.assertEqual(encode_params(params),
+                         [('q', '\xc3\xa9cole'), ('count', 20),
+                          ('since_id', '1')])
+        self.assertEqual(encode_params(None), None)
+
+    def test_non_ascii_search(self):
+        params = encode_params([('q', u'\xe9cole')])
+
+        self.assertEqual(cache_key('GET', URL, params),
+                         'GET %s?q=%%C3%%A9cole' % URL)
+        self.assertEqual(urllib.urlencode(params), 'q=%C3%A9cole')
+
+        signer = TwrSigner('c-key', 'c-secret', 'a-key', 'a-secret')
+        self.assertEqual(
+            signer.authorization_header('GET', URL, params, 'nonce', 1),
+            signer.authorization_header('GET', URL, [('q', u'\xe9cole')],
+                                        'nonce', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+try:
+    from gi.repository import GLib
+
+    from twitter import TwrAccount
+    from twitter import TwrObject
+    from twitter import TwrStatus
+except ImportError:
+    GLib = None
+
+
+@unittest.skipIf(GLib is None, 'needs PyGObject')
+class TwrStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        TwrAccount.set_secrets('c-key', 'c-secret', 'a-key', 'a-secret')
+
+        self._requests = []
+        self._schedule = TwrObject._schedule
+
+        def schedule(object, method, url, params, filepath, stream):
+            self._requests.append((method, url, params))
+
+        TwrObject._schedule = schedule
+
+    def tearDown(self):
+        TwrObject._schedule = self._schedule
+
+    def _run_idle(self):
+        context = GLib.MainContext.default()
+        while context.pending():
+            context.iteration(False)
+
+    def test_destroy_without_params(self):
+        TwrStatus('123').destroy()
+        self._run_idle()
+
+        self.assertEqual(self._requests,
+                         [('POST', TwrStatus.DESTROY_URL % '123', None)])
+
+    def test_retweet_without_params(self):
+        TwrStatus('123').retweet()
+        self._run_idle()
+
+        self.assertEqual(self._requests,
+                         [('POST', TwrStatus.RETWEET_URL % '123', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
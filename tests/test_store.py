@@ -0,0 +1,80 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+from twr_store import TwrStore
+
+
+def _tweet(id_str, reply_id='100'):
+    return {'id_str': id_str,
+            'in_reply_to_status_id_str': reply_id,
+            'user': {'name': 'someone'},
+            'text': 'reply %s' % id_str,
+            'created_at': None}
+
+
+class TwrStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+        self._store = TwrStore(os.path.join(self._path, 'twitter.db'))
+
+    def tearDown(self):
+        self._store.close()
+        shutil.rmtree(self._path)
+
+    def test_reply_seen_first_in_timeline(self):
+        tweet = _tweet('200')
+
+        self.assertEqual(self._store.add([tweet]), 1)
+        self.assertEqual(self._store.add([tweet], 'uid-1'), 1)
+
+        self.assertEqual([row[0] for row in self._store.replies('uid-1')],
+                         [u'200'])
+        self.assertEqual(self._store.count('uid-1'), 1)
+        self.assertEqual(self._store.last_id('uid-1'), '200')
+
+    def test_reply_not_taken_from_other_entry(self):
+        tweet = _tweet('200')
+
+        self._store.add([tweet], 'uid-1')
+        self.assertEqual(self._store.add([tweet], 'uid-2'), 0)
+        self.assertEqual(self._store.add([tweet]), 0)
+
+        self.assertEqual(self._store.count('uid-1'), 1)
+        self.assertEqual(self._store.count('uid-2'), 0)
+
+    def test_claimed_reply_indexed_once(self):
+        tweet = _tweet('200')
+
+        self._store.add([tweet])
+        self._store.add([tweet], 'uid-1')
+
+        self.assertEqual(len(self._store.search('reply')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
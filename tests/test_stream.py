@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Martin Abente Lahaye. - tch@sugarlabs.org
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301 USA.
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'extensions',
+                                'webservice', 'twitter', 'twitter'))
+
+from twr_stream import TwrJsonStream
+
+TWEETS = [{'id_str': '1', 'text': 'plain'},
+          {'id_str': '2', 'text': 'quote " and backslash \\ at the end\\'},
+          {'id_str': '3', 'text': 'braces } { ] [ and , commas'},
+          {'id_str': '4', 'text': u'caf\xe9', 'entities': {'urls': []}}]
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TwrJsonStreamTest(unittest.TestCase):
+
+    def _decode(self, chunks, key=None):
+        objects = []
+        stream = TwrJsonStream(objects.append, key)
+        for chunk in chunks:
+            stream.feed(chunk)
+        return objects, stream.close()
+
+    def test_array_in_one_chunk(self):
+        objects, rest = self._decode([json.dumps(TWEETS)])
+
+        self.assertEqual(objects, TWEETS)
+        self.assertEqual(rest, [])
+
+    def test_array_split_anywhere(self):
+        data = json.dumps(TWEETS)
+
+        for size in range(1, 9):
+            objects, rest = self._decode(_chunks(data, size))
+            self.assertEqual(objects, TWEETS)
+            self.assertEqual(rest, [])
+
+    def test_escape_at_chunk_end(self):
+        data = json.dumps([{'text': 'a \\" b'}])
+        index = data.index('\\')
+
+        objects, rest = self._decode([data[:index + 1], data[index + 1:]])
+        self.assertEqual(objects, [{'text': 'a \\" b'}])
+
+    def test_search_statuses(self):
+        metadata = {'query': 'sugar', 'count': 4, 'refresh_url': '?since_id=4'}
+        data = json.dumps({'statuses': TWEETS, 'search_metadata': metadata})
+
+        for size in (1, 7, len(data)):
+            objects, rest = self._decode(_chunks(data, size), 'statuses')
+            self.assertEqual(objects, TWEETS)
+            self.assertEqual(rest, {'statuses': [],
+                                    'search_metadata': metadata})
+
+    def test_other_keys_left_alone(self):
+        data = json.dumps({'search_metadata': {'ids': [{'id': 1}]},
+                           'statuses': TWEETS[:1]})
+
+        objects, rest = self._decode(_chunks(data, 3), 'statuses')
+        self.assertEqual(objects, TWEETS[:1])
+        self.assertEqual(rest['search_metadata'], {'ids': [{'id': 1}]})
+
+    def test_errors_document(self):
+        errors = {'errors': [{'code': 88, 'message': 'Rate limit exceeded'}]}
+
+        objects, rest = self._decode([json.dumps(errors)])
+        self.assertEqual(objects, [])
+        self.assertEqual(rest, errors)
+
+    def test_incomplete_object(self):
+        stream = TwrJsonStream(lambda tweet: None)
+        stream.feed('[{"id_str": "1"}, {"id_str": ')
+
+        self.assertRaises(ValueError, stream.close)
+
+
+if __name__ == '__main__':
+    unittest.main()